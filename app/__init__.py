@@ -12,10 +12,11 @@ from flask_mail import Mail
 from flask_talisman import Talisman
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
+from werkzeug.middleware.proxy_fix import ProxyFix
 from config import Config
 
 # Import custom filters and error handler
-from app.utils.filters import markdown_to_html, zip_filter, datetimefilter
+from app.utils.filters import markdown_to_html, markdowns_to_html, zip_filter, datetimefilter
 from app.utils.error_handler import ErrorHandler
 from app.utils.security_enhancer import SecurityEnhancer
 from app.utils.performance_optimizer import PerformanceOptimizer
@@ -56,6 +57,12 @@ def create_app(config_class=Config):
                 static_url_path='/static',
                 template_folder='templates')
     app.config.from_object(config_class)
+    
+    # Resolve client address/scheme/host from trusted proxy headers once, at
+    # the WSGI layer, so request.remote_addr is the real client IP
+    proxy_hops = app.config.get('PROXY_FIX_HOPS', 0)
+    if proxy_hops:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxy_hops, x_proto=proxy_hops, x_host=proxy_hops)
 
     # Initialize extensions with app
     db.init_app(app)
@@ -188,6 +195,7 @@ def create_app(config_class=Config):
 
     # Register custom Jinja filters (before blueprints)
     app.jinja_env.filters['markdown_to_html'] = markdown_to_html
+    app.jinja_env.filters['markdowns_to_html'] = markdowns_to_html
     app.jinja_env.filters['zip'] = zip_filter
     app.jinja_env.filters['datetimefilter'] = datetimefilter
     # Temporarily disabled i18n filters due to indentation errors
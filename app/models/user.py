@@ -106,11 +106,21 @@ class User(UserMixin, db.Model):
         if config.get('PASSWORD_REQUIRE_SPECIAL', True) and not re.search(r'[^A-Za-z0-9]', password):
             raise ValidationError('Password must contain at least one special character')
     
+    @staticmethod
+    def hash_password(password):
+        """Validate a password and return its hash without touching any user row."""
+        User.validate_password_strength(password)
+        method = current_app.config.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+        return generate_password_hash(password, method=method)
+    
     def set_password(self, password):
         """Set password after validating it meets requirements."""
-        self.validate_password_strength(password)
-        self.password_hash = generate_password_hash(password, method='pbkdf2:sha256:600000')
-        self.last_password_change = datetime.utcnow()
+        self.set_password_hash(self.hash_password(password))
+    
+    def set_password_hash(self, password_hash, changed_at=None):
+        """Set a hash produced by hash_password(), e.g. computed before a transaction."""
+        self.password_hash = password_hash
+        self.last_password_change = changed_at or datetime.utcnow()
 
     def update_streak(self, entry_time=None):
         from datetime import datetime, timedelta
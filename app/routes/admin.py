@@ -11,6 +11,7 @@ from app.models.audit_log import AuditLog
 from app.utils.decorators import admin_required
 from app.services.email_service import send_password_reset_email, send_admin_action_email
 from app.services.audit_service import AuditLogger
+from app.services.upload_service import delete_profile_pictures
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
@@ -168,6 +169,7 @@ def delete_user(user_id):
     # Store user info for flash message
     username = user.username
     email = user.email
+    profile_picture = user.profile_picture
     
     # Delete all user entries first
     Entry.query.filter_by(user_id=user_id).delete()
@@ -176,6 +178,9 @@ def delete_user(user_id):
     db.session.delete(user)
     db.session.commit()
     
+    # Remove uploaded files once the database rows are gone
+    delete_profile_pictures([profile_picture])
+    
     flash(f'User {username} and all their entries have been deleted. Notification sent to {email}', 'warning')
     return redirect(url_for('admin.users'))
 
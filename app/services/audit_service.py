@@ -228,15 +228,8 @@ class AuditLogger:
         """Get the client IP address from the request."""
         if not request:
             return None
-            
-        # Check for forwarded headers
-        if request.headers.get('X-Forwarded-For'):
-            return request.headers.get('X-Forwarded-For').split(',')[0].strip()
-        
-        if request.headers.get('X-Real-IP'):
-            return request.headers.get('X-Real-IP')
         
-        # Fall back to remote address
+        # Trusted forwarded headers are already applied by ProxyFix
         return request.remote_addr
     
     @staticmethod
@@ -85,20 +85,42 @@ def upload_profile_picture(file, user_id):
         return None, "Error uploading file"
 
 
+def _profile_picture_dir():
+    """Return the directory profile pictures are stored in."""
+    return os.path.join(current_app.static_folder, 'uploads', 'profile_pictures')
+
+
 def delete_profile_picture(filename):
     """Delete a profile picture file."""
+    if not filename:
+        return False
     try:
-        if filename:
-            file_path = os.path.join(current_app.static_folder, 'uploads', 'profile_pictures', filename)
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                return True
+        os.unlink(os.path.join(_profile_picture_dir(), filename))
+        return True
+    except FileNotFoundError:
         return False
     except Exception as e:
         logger.error(f"Error deleting profile picture: {str(e)}")
         return False
 
 
+def delete_profile_pictures(filenames):
+    """Delete several profile picture files, returning how many were removed."""
+    upload_dir = _profile_picture_dir()
+    removed = 0
+    for filename in filenames:
+        if not filename:
+            continue
+        try:
+            os.unlink(os.path.join(upload_dir, filename))
+            removed += 1
+        except FileNotFoundError:
+            logger.debug("Profile picture already gone: %s", filename)
+        except Exception as e:
+            logger.error(f"Error deleting profile picture {filename}: {str(e)}")
+    return removed
+
+
 def upload_attachment(file, entry_id):
     """Upload file attachment for an entry."""
     if not file or not allowed_file(file.filename):
@@ -0,0 +1,51 @@
+"""Shared HTML sanitizer settings for rendered markdown."""
+import bleach
+from bleach.css_sanitizer import CSSSanitizer
+
+# Entry content (markdown_to_html): bleach defaults plus formatting tags,
+# with inline styles restricted by CSS_SANITIZER.
+ALLOWED_TAGS = frozenset({
+    *bleach.sanitizer.ALLOWED_TAGS,
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'br', 'pre', 'code', 'hr',
+    'span', 'div', 'blockquote', 'img', 'a', 'ul', 'ol', 'li', 'strong',
+    'em', 'u', 's', 'sub', 'sup', 'table', 'thead', 'tbody', 'tr', 'th', 'td'
+})
+
+ALLOWED_ATTRIBUTES = {
+    'a': ('href', 'title', 'target'),
+    'img': ('src', 'alt', 'title'),
+    '*': ('class', 'id', 'style'),
+}
+
+CSS_SANITIZER = CSSSanitizer(
+    allowed_css_properties=(
+        'color', 'background-color', 'font-weight', 'font-style', 'text-decoration',
+        'text-align', 'margin', 'margin-top', 'margin-bottom', 'margin-left', 'margin-right',
+        'padding', 'padding-top', 'padding-bottom', 'padding-left', 'padding-right'
+    ),
+    allowed_svg_properties=(),
+)
+
+# Stricter set used by render_markdown: no inline styles or ids.
+MARKDOWN_ALLOWED_TAGS = frozenset({
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+    'b', 'i', 'strong', 'em', 'tt',
+    'p', 'br', 'span', 'div', 'blockquote', 'code', 'hr',
+    'ul', 'ol', 'li', 'dd', 'dt', 'dl',
+    'img', 'a', 'sub', 'sup', 's', 'u', 'pre',
+    'table', 'thead', 'tbody', 'tr', 'th', 'td'
+})
+
+MARKDOWN_ALLOWED_ATTRIBUTES = {
+    'a': ('href', 'title', 'target', 'rel'),
+    'img': ('src', 'alt', 'title', 'width', 'height'),
+    'div': ('class',),
+    'span': ('class',),
+    'code': ('class',),
+    'pre': ('class',),
+    'p': ('class',),
+    'table': ('class', 'border', 'cellpadding', 'cellspacing'),
+    'th': ('scope',)
+}
+
+ALLOWED_PROTOCOLS = frozenset({'http', 'https', 'mailto', 'tel'})
@@ -4,24 +4,37 @@ from functools import wraps
 from flask import flash, redirect, url_for, abort, session, request
 from flask_login import current_user
 
+# Resolved lazily on first use; app.routes.two_factor imports this module.
+_check_2fa_verification = None
+
+
+def _get_check_2fa_verification():
+    """Return the 2FA verification helper, importing it once on first use."""
+    global _check_2fa_verification
+    if _check_2fa_verification is None:
+        from app.routes.two_factor import check_2fa_verification
+        _check_2fa_verification = check_2fa_verification
+    return _check_2fa_verification
+
 
 def admin_required(f):
     """Decorator to ensure user is logged in and has admin privileges."""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if not current_user.is_authenticated:
+        # Resolve the proxied user once instead of on every attribute access
+        user = current_user._get_current_object()
+
+        if not user.is_authenticated:
             flash('Please log in to access this page.', 'warning')
             return redirect(url_for('auth.login'))
         
-        if not current_user.is_admin:
+        if not user.is_admin:
             flash('Admin access required for this page.', 'danger')
             return redirect(url_for('main.dashboard'))
         
         # Check 2FA verification for admin users
-        if current_user.two_factor_enabled:
-            # Import here to avoid circular import
-            from app.routes.two_factor import check_2fa_verification
-            if not check_2fa_verification():
+        if user.two_factor_enabled:
+            if not _get_check_2fa_verification()():
                 session['2fa_next'] = request.url if request.url else url_for('main.dashboard')
                 flash('Two-factor authentication is required for admin access.', 'info')
                 return redirect(url_for('two_factor.verify'))
@@ -34,7 +47,8 @@ def admin_or_404(f):
     """Decorator that returns 404 if user is not admin (instead of redirecting)."""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if not current_user.is_authenticated or not current_user.is_admin:
+        user = current_user._get_current_object()
+        if not (user.is_authenticated and user.is_admin):
             abort(404)
         return f(*args, **kwargs)
     return decorated_function
@@ -1,61 +1,159 @@
-from markdown import markdown
+import logging
+import threading
+from collections import OrderedDict
+from markdown import Markdown
 import bleach
-from bleach.css_sanitizer import CSSSanitizer
 from flask import current_app
-import itertools
-
-# Markdown and HTML sanitization settings
-ALLOWED_TAGS = {
-    *bleach.sanitizer.ALLOWED_TAGS,
-    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'br', 'pre', 'code', 'hr',
-    'span', 'div', 'blockquote', 'img', 'a', 'ul', 'ol', 'li', 'strong',
-    'em', 'u', 's', 'sub', 'sup', 'table', 'thead', 'tbody', 'tr', 'th', 'td'
-}
-
-ALLOWED_ATTRIBUTES = {
-    'a': ['href', 'title', 'target'],
-    'img': ['src', 'alt', 'title'],
-    '*': ['class', 'id', 'style'],
-}
-
-CSS_SANITIZER = CSSSanitizer(
-    allowed_css_properties=[
-        'color', 'background-color', 'font-weight', 'font-style', 'text-decoration',
-        'text-align', 'margin', 'margin-top', 'margin-bottom', 'margin-left', 'margin-right',
-        'padding', 'padding-top', 'padding-bottom', 'padding-left', 'padding-right'
-    ],
-    allowed_svg_properties=[],
-)
+from app.utils._sanitizer import ALLOWED_TAGS, ALLOWED_ATTRIBUTES, CSS_SANITIZER
+
+# Pygments highlighting (codehilite) is opt-in via MARKDOWN_CODEHILITE
+MARKDOWN_EXTENSIONS = [
+    'extra',
+    'tables',
+    'fenced_code',
+    'nl2br',
+    'sane_lists'
+]
+
+# Markdown and bleach.Cleaner instances are not thread-safe, so each thread
+# builds its own once and reuses it for every render.
+_TLS = threading.local()
+
+# Rendered output is a pure function of the source text, so repeat renders of
+# the same entry are served from memory. Very large documents bypass the cache.
+MARKDOWN_CACHE_SIZE = 2048
+MARKDOWN_CACHE_MAX_LENGTH = 64000
+
+# LRU of (codehilite flag, source text) -> sanitized HTML, shared by single
+# and batch renders; the flag keeps apps with different configs apart
+_render_cache = OrderedDict()
+_render_cache_lock = threading.Lock()
+
+# Joins rendered fragments for a single sanitizer pass in markdowns_to_html;
+# written exactly as bleach serializes it so it survives cleaning unchanged.
+BATCH_SEPARATOR = '<hr class="__bleach_sep__">'
+
+def _codehilite_enabled():
+    """Whether the current app renders code blocks with Pygments."""
+    return bool(current_app.config.get('MARKDOWN_CODEHILITE'))
+
+def _get_markdown(codehilite):
+    """Return this thread's Markdown converter for the codehilite setting."""
+    converters = getattr(_TLS, 'converters', None)
+    if converters is None:
+        converters = _TLS.converters = {}
+    md = converters.get(codehilite)
+    if md is None:
+        extensions = MARKDOWN_EXTENSIONS
+        if codehilite:
+            extensions = extensions + ['codehilite']
+        md = converters[codehilite] = Markdown(
+            extensions=extensions,
+            output_format='html5'
+        )
+    return md
+
+def _get_cleaner():
+    """Return this thread's HTML sanitizer."""
+    cleaner = getattr(_TLS, 'cleaner', None)
+    if cleaner is None:
+        cleaner = _TLS.cleaner = bleach.Cleaner(
+            tags=ALLOWED_TAGS,
+            attributes=ALLOWED_ATTRIBUTES,
+            css_sanitizer=CSS_SANITIZER
+        )
+    return cleaner
+
+def _render_markdown(content, codehilite):
+    """Render markdown and sanitize the resulting HTML."""
+    html = _get_markdown(codehilite).reset().convert(content)
+    return _get_cleaner().clean(html)
+
+def _cache_get(key):
+    """Return the cached HTML for a (codehilite, content) key, or None."""
+    with _render_cache_lock:
+        html = _render_cache.get(key)
+        if html is not None:
+            _render_cache.move_to_end(key)
+        return html
+
+def _cache_put(key, html):
+    """Store rendered HTML, evicting the least recently used entry when full."""
+    with _render_cache_lock:
+        _render_cache[key] = html
+        _render_cache.move_to_end(key)
+        if len(_render_cache) > MARKDOWN_CACHE_SIZE:
+            _render_cache.popitem(last=False)
+
+def _render_markdown_cached(content, codehilite):
+    """Render and sanitize markdown, memoized by content and codehilite setting."""
+    key = (codehilite, content)
+    html = _cache_get(key)
+    if html is None:
+        html = _render_markdown(content, codehilite)
+        _cache_put(key, html)
+    return html
 
 def markdown_to_html(content):
     """Convert markdown to safe HTML."""
     try:
-        if not content:
-            current_app.logger.debug('Empty content provided to markdown_to_html')
+        if not content or not content.strip():
             return ""
             
-        current_app.logger.debug('Converting markdown to HTML')
-        # Convert markdown to HTML
-        html = markdown(content, extensions=[
-            'extra',
-            'codehilite',
-            'tables',
-            'fenced_code',
-            'nl2br',
-            'sane_lists'
-        ])
-        # Sanitize HTML to prevent XSS
-        clean_html = bleach.clean(
-            html,
-            tags=ALLOWED_TAGS,
-            attributes=ALLOWED_ATTRIBUTES,
-            css_sanitizer=CSS_SANITIZER
-        )
-        return clean_html
+        if current_app.logger.isEnabledFor(logging.DEBUG):
+            current_app.logger.debug('Converting markdown to HTML')
+        # Convert markdown to HTML and sanitize it to prevent XSS
+        codehilite = _codehilite_enabled()
+        if len(content) > MARKDOWN_CACHE_MAX_LENGTH:
+            return _render_markdown(content, codehilite)
+        return _render_markdown_cached(content, codehilite)
     except Exception as e:
         current_app.logger.error(f'Error converting markdown to HTML: {str(e)}', exc_info=True)
         return "<p>Error rendering content</p>"
 
+def markdowns_to_html(contents):
+    """Convert several markdown documents to safe HTML, sanitizing in one pass.
+
+    Documents containing raw HTML are rendered individually: unbalanced tags
+    in one fragment would otherwise bleed into its neighbours when the joined
+    output is parsed, and could forge the separator. Documents already in
+    the render cache are served from it; only the misses are batched.
+    """
+    try:
+        contents = list(contents)
+        results = [""] * len(contents)
+        codehilite = _codehilite_enabled()
+        batch = []
+        for index, content in enumerate(contents):
+            if not content or not content.strip():
+                continue
+            if '<' in content or len(content) > MARKDOWN_CACHE_MAX_LENGTH:
+                results[index] = markdown_to_html(content)
+                continue
+            cached = _cache_get((codehilite, content))
+            if cached is not None:
+                results[index] = cached
+            else:
+                batch.append(index)
+
+        if len(batch) == 1:
+            results[batch[0]] = markdown_to_html(contents[batch[0]])
+        elif batch:
+            md = _get_markdown(codehilite)
+            raw = BATCH_SEPARATOR.join(md.reset().convert(contents[i]) for i in batch)
+            fragments = _get_cleaner().clean(raw).split(BATCH_SEPARATOR)
+            if len(fragments) == len(batch):
+                for index, fragment in zip(batch, fragments):
+                    results[index] = fragment
+                    _cache_put((codehilite, contents[index]), fragment)
+            else:
+                for index in batch:
+                    results[index] = markdown_to_html(contents[index])
+        return results
+    except Exception as e:
+        current_app.logger.error(f'Error converting markdown batch to HTML: {str(e)}', exc_info=True)
+        return ["<p>Error rendering content</p>"] * len(contents)
+
 def zip_filter(*iterables):
     """Zip filter for Jinja2 templates - combines multiple iterables."""
     try:
@@ -1,59 +1,78 @@
 """Markdown processing utilities."""
+import threading
 import markdown
 import bleach
-from flask import Markup
+from flask import current_app, has_app_context
+from markupsafe import Markup
+from app.utils._sanitizer import (
+    MARKDOWN_ALLOWED_TAGS, MARKDOWN_ALLOWED_ATTRIBUTES, ALLOWED_PROTOCOLS
+)
+
+# Minimal default set; heavier extensions are enabled only when the text
+# uses them (footnotes, [TOC]) or when MARKDOWN_CODEHILITE is configured.
+MARKDOWN_EXTENSIONS = (
+    'fenced_code',
+    'tables'
+)
+
+# Markdown and bleach.Cleaner instances are not thread-safe, so each thread
+# builds its own once and reuses it for every render.
+_TLS = threading.local()
 
 def allowed_tags():
     """Return a list of allowed HTML tags for markdown rendering."""
-    return [
-        'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
-        'b', 'i', 'strong', 'em', 'tt',
-        'p', 'br', 'span', 'div', 'blockquote', 'code', 'hr',
-        'ul', 'ol', 'li', 'dd', 'dt', 'dl',
-        'img', 'a', 'sub', 'sup', 's', 'u', 'pre',
-        'table', 'thead', 'tbody', 'tr', 'th', 'td'
-    ]
+    return sorted(MARKDOWN_ALLOWED_TAGS)
 
 def allowed_attributes():
     """Return a dictionary of allowed HTML attributes."""
-    return {
-        'a': ['href', 'title', 'target', 'rel'],
-        'img': ['src', 'alt', 'title', 'width', 'height'],
-        'div': ['class'],
-        'span': ['class'],
-        'code': ['class'],
-        'pre': ['class'],
-        'p': ['class'],
-        'table': ['class', 'border', 'cellpadding', 'cellspacing'],
-        'th': ['scope']
-    }
+    return {tag: list(attrs) for tag, attrs in MARKDOWN_ALLOWED_ATTRIBUTES.items()}
+
+def _extensions_for(text):
+    """Return the markdown extensions needed to render text."""
+    extensions = MARKDOWN_EXTENSIONS
+    if has_app_context() and current_app.config.get('MARKDOWN_CODEHILITE'):
+        extensions += ('codehilite',)
+    if '[^' in text:
+        extensions += ('footnotes',)
+    if '[TOC]' in text:
+        extensions += ('toc',)
+    return extensions
+
+def _get_markdown(extensions=MARKDOWN_EXTENSIONS):
+    """Return this thread's Markdown converter for an extension set."""
+    pool = getattr(_TLS, 'md_pool', None)
+    if pool is None:
+        pool = _TLS.md_pool = {}
+    md = pool.get(extensions)
+    if md is None:
+        md = pool[extensions] = markdown.Markdown(
+            extensions=list(extensions),
+            output_format='html5'
+        )
+    return md
+
+def _get_cleaner():
+    """Return this thread's HTML sanitizer."""
+    cleaner = getattr(_TLS, 'cleaner', None)
+    if cleaner is None:
+        cleaner = _TLS.cleaner = bleach.Cleaner(
+            tags=MARKDOWN_ALLOWED_TAGS,
+            attributes=MARKDOWN_ALLOWED_ATTRIBUTES,
+            protocols=ALLOWED_PROTOCOLS,
+            strip=True
+        )
+    return cleaner
 
 def render_markdown(text):
     """Render markdown text to HTML with XSS protection."""
-    if not text:
-        return ''
+    if not text or not text.strip():
+        return Markup('')
     
     # Convert markdown to HTML
-    html = markdown.markdown(
-        text,
-        extensions=[
-            'fenced_code',
-            'codehilite',
-            'tables',
-            'footnotes',
-            'toc'
-        ],
-        output_format='html5'
-    )
+    html = _get_markdown(_extensions_for(text)).reset().convert(text)
     
     # Clean HTML to prevent XSS
-    cleaned_html = bleach.clean(
-        html,
-        tags=allowed_tags(),
-        attributes=allowed_attributes(),
-        protocols=['http', 'https', 'mailto', 'tel'],
-        strip=True
-    )
+    cleaned_html = _get_cleaner().clean(html)
     
     return Markup(cleaned_html)
 
@@ -3,11 +3,18 @@ Performance Optimization System
 Provides comprehensive performance monitoring and optimization
 """
 
+import os
 import time
-import json
 import hashlib
+import itertools
+import math
+import pickle
 import functools
-from datetime import datetime, timedelta
+import queue
+import secrets
+import threading
+import weakref
+from collections import OrderedDict, deque
 from flask import current_app, request, g
 from flask_login import current_user
 from typing import Dict, List, Any, Optional
@@ -21,13 +28,102 @@ except ImportError:
     REDIS_AVAILABLE = False
     redis = None
 
+# Redis stream holding recent request metrics, capped (approximately) in size
+METRICS_STREAM_KEY = 'perf:stream'
+METRICS_STREAM_MAXLEN = 100000
+
+# Aggregates the stream window inside Redis and returns one row per
+# endpoint:method as {key, count, sum, min, max, {status, count, ...},
+# p50, p95, p99}. Percentiles use the nearest-rank method. Floats are
+# returned as strings because Redis truncates Lua numbers.
+METRICS_AGGREGATE_LUA = """
+local entries = redis.call('XRANGE', KEYS[1], ARGV[1], '+')
+local only = ARGV[2]
+local acc, order = {}, {}
+local function percentile(sorted, p)
+    local i = math.ceil(p * #sorted / 100)
+    if i < 1 then i = 1 end
+    return tostring(sorted[i])
+end
+for i = 1, #entries do
+    local f = entries[i][2]
+    local ep, m, sc, d
+    for j = 1, #f, 2 do
+        local k, v = f[j], f[j + 1]
+        if k == 'ep' then ep = v
+        elseif k == 'm' then m = v
+        elseif k == 'sc' then sc = v
+        elseif k == 'd' then d = tonumber(v) end
+    end
+    if d and ep and m and sc and (only == '' or ep == only) then
+        local key = ep .. ':' .. m
+        local a = acc[key]
+        if not a then
+            a = {0, 0, d, d, {}, {}}
+            acc[key] = a
+            order[#order + 1] = key
+        end
+        a[1] = a[1] + 1
+        a[2] = a[2] + d
+        if d < a[3] then a[3] = d end
+        if d > a[4] then a[4] = d end
+        a[5][sc] = (a[5][sc] or 0) + 1
+        a[6][a[1]] = d
+    end
+end
+local out = {}
+for _, key in ipairs(order) do
+    local a = acc[key]
+    local codes = {}
+    for sc, c in pairs(a[5]) do
+        codes[#codes + 1] = sc
+        codes[#codes + 1] = c
+    end
+    local durations = a[6]
+    table.sort(durations)
+    out[#out + 1] = {
+        key, a[1], tostring(a[2]), tostring(a[3]), tostring(a[4]), codes,
+        percentile(durations, 50), percentile(durations, 95), percentile(durations, 99)
+    }
+end
+return out
+"""
+
+# Maximum number of endpoint/method keys kept by the in-memory fallback
+MEMORY_CACHE_MAX_KEYS = 512
+
+# Metrics waiting to be flushed to Redis; new ones are dropped past this size
+METRICS_BUFFER_MAX = 10000
+
+perf_logger = logging.getLogger('performance')
+
+def _percentile(sorted_values, percent):
+    """Nearest-rank percentile of an already sorted, non-empty list"""
+    index = max(math.ceil(percent * len(sorted_values) / 100) - 1, 0)
+    return sorted_values[index]
+
 class PerformanceOptimizer:
     """Comprehensive performance optimization system"""
     
     def __init__(self, app=None):
         self.app = app
         self.redis_client = None
+        self._aggregate_script = None
         self.metrics = {}
+        # Redis writes are queued here and flushed by a background thread
+        self._metric_queue = queue.Queue(maxsize=METRICS_BUFFER_MAX)
+        self._flush_lock = threading.Lock()
+        self._flush_thread = None
+        self.flush_batch = 1000
+        self.metrics_dropped = 0
+        # Request IDs are a random per-process prefix + counter: pids repeat
+        # across containers and hosts, and only one entropy read per process
+        self._request_prefix = secrets.token_hex(4)
+        self._request_counter = itertools.count()
+        if hasattr(os, 'register_at_fork'):
+            # Threads do not survive fork; workers start their own flusher
+            # and request ID sequence
+            os.register_at_fork(after_in_child=self._after_fork)
         if app:
             self.init_app(app)
     
@@ -38,10 +134,12 @@ class PerformanceOptimizer:
             try:
                 self.redis_client = redis.from_url(
                     app.config.get('REDIS_URL', 'redis://localhost:6379'),
-                    decode_responses=True
+                    decode_responses=False  # Replies are parsed here; skip decoding on every read
                 )
                 # Test connection
                 self.redis_client.ping()
+                # Loaded lazily via EVALSHA, re-sent automatically on NOSCRIPT
+                self._aggregate_script = self.redis_client.register_script(METRICS_AGGREGATE_LUA)
                 app.logger.info("Redis connected for performance optimization")
             except Exception as e:
                 app.logger.warning(f"Redis not available for performance optimization: {e}")
@@ -50,16 +148,24 @@ class PerformanceOptimizer:
             app.logger.info("Redis not installed, using in-memory caching")
             self.redis_client = None
         
+        self.flush_batch = app.config.get('METRICS_FLUSH_BATCH', 1000)
+        # Static assets and health checks add noise, not signal, to the stats
+        self._skip_endpoints = frozenset({'static'}) | frozenset(app.config.get('PERF_SKIP_ENDPOINTS', ()))
+        
         # Add performance monitoring to all requests
         @app.before_request
         def before_request():
-            g.start_time = time.time()
+            g.start_time = time.perf_counter()
             g.request_id = self.generate_request_id()
         
         @app.after_request
         def after_request(response):
+            # Static assets and health checks are not worth a metric write or timing header
+            if request.endpoint in self._skip_endpoints:
+                return response
+            
             if hasattr(g, 'start_time'):
-                duration = time.time() - g.start_time
+                duration = time.perf_counter() - g.start_time
                 self.record_request_metric(
                     endpoint=request.endpoint,
                     method=request.method,
@@ -67,9 +173,10 @@ class PerformanceOptimizer:
                     duration=duration,
                     user_id=current_user.id if current_user.is_authenticated else None
                 )
-            
-            # Add performance headers
-            response.headers['X-Response-Time'] = f"{getattr(g, 'start_time', 0) and (time.time() - g.start_time):.3f}s"
+                
+                # Timing header is opt-in outside debug mode
+                if app.config.get('PERF_RESPONSE_HEADER', app.debug):
+                    response.headers['X-Response-Time'] = '%.3fs' % duration
             return response
         
         # Setup performance logging
@@ -78,7 +185,6 @@ class PerformanceOptimizer:
     def setup_performance_logging(self, app):
         """Setup performance-specific logging"""
         # Ensure logs directory exists
-        import os
         logs_dir = os.path.join(os.getcwd(), 'logs')
         os.makedirs(logs_dir, exist_ok=True)
         
@@ -96,13 +202,12 @@ class PerformanceOptimizer:
     
     def generate_request_id(self):
         """Generate unique request ID"""
-        import uuid
-        return str(uuid.uuid4())[:8]
+        return f"{self._request_prefix}-{next(self._request_counter):x}"
     
     def record_request_metric(self, endpoint, method, status_code, duration, user_id=None):
         """Record request performance metrics"""
         metric = {
-            'timestamp': datetime.utcnow().isoformat(),
+            'timestamp': time.time(),
             'endpoint': endpoint,
             'method': method,
             'status_code': status_code,
@@ -113,90 +218,221 @@ class PerformanceOptimizer:
         
         # Store in Redis if available, otherwise use in-memory storage
         if self.redis_client:
-            key = f"perf:{endpoint}:{method}"
-            self.redis_client.lpush(key, json.dumps(metric))
-            self.redis_client.expire(key, 3600)  # Keep 1 hour of data
+            # Hand off to the background flusher; no Redis call on the request path
+            if self._flush_thread is None:
+                self._start_flush_thread()
+            try:
+                self._metric_queue.put_nowait({
+                    'ep': str(endpoint),
+                    'm': method,
+                    'sc': status_code,
+                    'd': duration,
+                    'u': user_id if user_id is not None else '',
+                    'ip': metric['ip'] or ''
+                })
+            except queue.Full:
+                # Redis is not keeping up; shed load rather than grow memory
+                self.metrics_dropped += 1
         else:
             # Fallback to in-memory storage (not persistent)
             if not hasattr(self, '_memory_cache'):
-                self._memory_cache = {}
+                self._memory_cache = OrderedDict()
             key = f"perf:{endpoint}:{method}"
-            if key not in self._memory_cache:
-                self._memory_cache[key] = []
-            self._memory_cache[key].append(metric)
-            # Keep only last 100 items in memory
-            if len(self._memory_cache[key]) > 100:
-                self._memory_cache[key] = self._memory_cache[key][-100:]
+            buffer = self._memory_cache.get(key)
+            if buffer is None:
+                # Ring buffer keeps only the last 100 items per key, and the
+                # least recently written keys are evicted past the cap
+                buffer = self._memory_cache[key] = deque(maxlen=100)
+                if len(self._memory_cache) > MEMORY_CACHE_MAX_KEYS:
+                    self._memory_cache.popitem(last=False)
+            else:
+                self._memory_cache.move_to_end(key)
+            buffer.append(metric)
         
         # Log slow requests
         if duration > 2.0:  # Requests over 2 seconds
-            if hasattr(current_app, 'performance_logger'):
-                current_app.performance_logger.warning(
-                    f"Slow request: {method} {endpoint} - {duration:.3f}s"
-                )
+            perf_logger.warning(f"Slow request: {method} {endpoint} - {duration:.3f}s")
+    
+    def _start_flush_thread(self):
+        """Start the background thread that flushes buffered metrics"""
+        with self._flush_lock:
+            if self._flush_thread is None:
+                thread = threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True)
+                thread.start()
+                self._flush_thread = thread
+    
+    def _after_fork(self):
+        """Reset per-process state so a forked child starts its own flusher"""
+        self._flush_lock = threading.Lock()
+        self._metric_queue = queue.Queue(maxsize=METRICS_BUFFER_MAX)
+        self._flush_thread = None
+        self._request_prefix = secrets.token_hex(4)
+        self._request_counter = itertools.count()
+    
+    def _flush_loop(self):
+        """Block until metrics arrive, then write whatever is queued as one batch"""
+        metric_queue = self._metric_queue
+        while True:
+            items = [metric_queue.get()]
+            try:
+                self._write_metrics(self._drain_queue(items))
+            except Exception as e:
+                perf_logger.warning(f"Failed to flush performance metrics: {e}")
+    
+    def _drain_queue(self, items):
+        """Move queued metrics into items without blocking, up to one batch"""
+        metric_queue = self._metric_queue
+        try:
+            while len(items) < self.flush_batch:
+                items.append(metric_queue.get_nowait())
+        except queue.Empty:
+            pass
+        return items
+    
+    def flush_metrics(self):
+        """Write up to one batch of queued metrics to Redis in a single pipeline"""
+        return self._write_metrics(self._drain_queue([]))
+    
+    def _write_metrics(self, items):
+        """Append metrics to the Redis stream in a single pipeline"""
+        if not items or not self.redis_client:
+            return 0
+        
+        # Stream entry IDs carry the server time, so reads can range by time;
+        # MAXLEN ~ lets Redis trim whole nodes cheaply
+        pipe = self.redis_client.pipeline(transaction=False)
+        for fields in items:
+            pipe.xadd(METRICS_STREAM_KEY, fields, maxlen=METRICS_STREAM_MAXLEN, approximate=True)
+        pipe.execute()
+        return len(items)
     
     def get_performance_stats(self, endpoint=None, hours=1):
         """Get performance statistics"""
-        stats = {}
-        end_time = datetime.utcnow()
-        start_time = end_time - timedelta(hours=hours)
+        start_time = time.time() - hours * 3600
         
-        if endpoint:
-            endpoints = [endpoint]
+        if self.redis_client:
+            if self._aggregate_script is not None:
+                try:
+                    return self._redis_aggregate_stats(start_time, endpoint)
+                except Exception as e:
+                    perf_logger.warning(f"Server-side metrics aggregation failed: {e}")
+            
+            # Only entries inside the window are transferred
+            try:
+                entries = self.redis_client.xrange(METRICS_STREAM_KEY, min=int(start_time * 1000), max='+')
+            except Exception:
+                return {}
+            endpoint_filter = endpoint.encode('utf-8') if endpoint else None
+            samples = (
+                ((fields[b'ep'] + b':' + fields[b'm']).decode('utf-8'), float(fields[b'd']), int(fields[b'sc']))
+                for _, fields in entries
+                if endpoint_filter is None or fields[b'ep'] == endpoint_filter
+            )
+        elif hasattr(self, '_memory_cache'):
+            samples = (
+                (key[len('perf:'):], item['duration'], item['status_code'])
+                for key, items in list(self._memory_cache.items())
+                if key.startswith('perf:') and (not endpoint or key[len('perf:'):].rsplit(':', 1)[0] == endpoint)
+                for item in list(items)
+                if item['timestamp'] >= start_time
+            )
         else:
-            # Get all endpoints from cache
-            endpoints = []
-            if self.redis_client:
-                for key in self.redis_client.scan_iter("perf:*"):
-                    parts = key.decode().split(':') if isinstance(key, bytes) else key.split(':')
-                    if len(parts) >= 3:
-                        endpoints.append(parts[-2])
-            elif hasattr(self, '_memory_cache'):
-                for key in self._memory_cache.keys():
-                    parts = key.split(':')
-                    if len(parts) >= 3:
-                        endpoints.append(parts[-2])
-        
-        for ep in endpoints:
-            for method in ['GET', 'POST', 'PUT', 'DELETE']:
-                key = f"perf:{ep}:{method}"
-                data = []
-                
-                if self.redis_client:
-                    try:
-                        raw_data = self.redis_client.lrange(key, 0, -1)
-                        data = [json.loads(item) for item in raw_data]
-                    except:
-                        continue
-                elif hasattr(self, '_memory_cache') and key in self._memory_cache:
-                    data = self._memory_cache[key]
-                
-                if data:
-                    durations = []
-                    status_codes = {}
-                    
-                    for item in data:
-                        try:
-                            metric_time = datetime.fromisoformat(item['timestamp'])
-                            
-                            if metric_time >= start_time:
-                                durations.append(item['duration'])
-                                status_code = item['status_code']
-                                status_codes[status_code] = status_codes.get(status_code, 0) + 1
-                        except:
-                            continue
-                    
-                    if durations:
-                        stats[f"{ep}:{method}"] = {
-                            'count': len(durations),
-                            'avg_duration': sum(durations) / len(durations),
-                            'min_duration': min(durations),
-                            'max_duration': max(durations),
-                            'status_codes': status_codes
-                        }
+            return {}
         
+        return self._aggregate_samples(samples)
+    
+    def _redis_aggregate_stats(self, start_time, endpoint=None):
+        """Aggregate the metrics window inside Redis in one round-trip"""
+        rows = self._aggregate_script(
+            keys=[METRICS_STREAM_KEY],
+            args=[int(start_time * 1000), endpoint or '']
+        )
+        stats = {}
+        for key, count, total, min_duration, max_duration, codes, p50, p95, p99 in rows:
+            stats[key.decode('utf-8')] = {
+                'count': count,
+                'avg_duration': float(total) / count,
+                'min_duration': float(min_duration),
+                'max_duration': float(max_duration),
+                'p50_duration': float(p50),
+                'p95_duration': float(p95),
+                'p99_duration': float(p99),
+                'status_codes': {int(codes[i]): codes[i + 1] for i in range(0, len(codes), 2)}
+            }
+        return stats
+    
+    @staticmethod
+    def _aggregate_samples(samples):
+        """Reduce (key, duration, status_code) samples to per-key statistics"""
+        # Single pass groups durations and status codes per key; one sort per
+        # key then yields min, max and the percentiles
+        totals = {}
+        for key, duration, status_code in samples:
+            acc = totals.get(key)
+            if acc is None:
+                acc = totals[key] = ([], {})
+            acc[0].append(duration)
+            status_codes = acc[1]
+            status_codes[status_code] = status_codes.get(status_code, 0) + 1
+        
+        stats = {}
+        for key, (durations, status_codes) in totals.items():
+            durations.sort()
+            count = len(durations)
+            stats[key] = {
+                'count': count,
+                'avg_duration': sum(durations) / count,
+                'min_duration': durations[0],
+                'max_duration': durations[-1],
+                'p50_duration': _percentile(durations, 50),
+                'p95_duration': _percentile(durations, 95),
+                'p99_duration': _percentile(durations, 99),
+                'status_codes': status_codes
+            }
         return stats
 
+# Resolved cache backend per application, so hot paths skip the lookup
+_app_caches = weakref.WeakKeyDictionary()
+
+def resolve_cache(app):
+    """Return the Flask-Caching backend registered on an app, or None"""
+    cache = app.extensions.get('cache')
+    if isinstance(cache, dict):
+        # Flask-Caching registers {Cache instance: backend}
+        cache = next(iter(cache.values()), None)
+    return cache
+
+def get_cache():
+    """Return the current app's cache backend, resolved once per app"""
+    app = current_app._get_current_object()
+    try:
+        return _app_caches[app]
+    except KeyError:
+        cache = _app_caches[app] = resolve_cache(app)
+        return cache
+
+def _canonical(value):
+    """Put sets and dicts into a fixed order; pickled set order depends on PYTHONHASHSEED"""
+    if isinstance(value, (set, frozenset)):
+        return (type(value).__name__, sorted((_canonical(item) for item in value), key=repr))
+    if isinstance(value, dict):
+        return ('dict', sorted(((_canonical(k), _canonical(v)) for k, v in value.items()), key=repr))
+    if isinstance(value, list):
+        return [_canonical(item) for item in value]
+    if isinstance(value, tuple):
+        return tuple(_canonical(item) for item in value)
+    return value
+
+def make_cache_key(prefix, args, kwargs):
+    """Build a stable, process-independent cache key for a call's arguments"""
+    payload = _canonical((args, kwargs))
+    try:
+        data = pickle.dumps(payload, protocol=4)
+    except Exception:
+        # Unpicklable arguments fall back to their repr
+        data = repr(payload).encode('utf-8')
+    return f"{prefix}:{hashlib.blake2b(data, digest_size=16).hexdigest()}"
+
 # Query Optimization
 class QueryOptimizer:
     """Database query optimization"""
@@ -215,18 +451,18 @@ class QueryOptimizer:
     def cache_query_result(cache_key, query_func, timeout=300):
         """Cache query results"""
         def wrapper(*args, **kwargs):
-            from flask import current_app
-            cache = current_app.extensions.get('cache')
+            cache = get_cache()
+            key = make_cache_key(cache_key, args, kwargs) if args or kwargs else cache_key
             
-            if cache:
-                result = cache.get(cache_key)
+            if cache is not None:
+                result = cache.get(key)
                 if result is not None:
                     return result
             
             result = query_func(*args, **kwargs)
             
-            if cache:
-                cache.set(cache_key, result, timeout=timeout)
+            if cache is not None:
+                cache.set(key, result, timeout=timeout)
             
             return result
         
@@ -243,30 +479,46 @@ class ResponseCache:
     
     def init_app(self, app):
         """Initialize response caching"""
-        self.cache = app.extensions.get('cache')
+        self.cache = resolve_cache(app)
     
     def cache_response(self, timeout=300, key_func=None):
         """Decorator for caching responses"""
         def decorator(f):
             @functools.wraps(f)
             def decorated_function(*args, **kwargs):
-                if not self.cache:
+                if self.cache is None:
                     return f(*args, **kwargs)
                 
                 # Generate cache key
                 if key_func:
                     cache_key = key_func(*args, **kwargs)
                 else:
-                    cache_key = f"response:{request.endpoint}:{request.url}"
+                    # Query parameter order must not split the cache
+                    cache_key = make_cache_key(
+                        f"response:{request.endpoint}",
+                        (request.host, request.path, sorted(request.args.items(multi=True))),
+                        {}
+                    )
                 
                 # Try to get cached response
-                cached_response = self.cache.get(cache_key)
-                if cached_response is not None:
-                    return cached_response
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    data, status_code, headers = cached
+                    return current_app.response_class(data, status=status_code, headers=headers)
                 
-                # Generate and cache response
-                response = f(*args, **kwargs)
-                self.cache.set(cache_key, response, timeout=timeout)
+                # Generate and cache response; only the body, status and
+                # headers are stored, not the pickled Response object.
+                # Responses that set a cookie or vary per client are never
+                # cached, or a hit would replay them to other clients
+                response = current_app.make_response(f(*args, **kwargs))
+                vary = {value.lower() for value in response.vary}
+                if not (response.is_streamed or 'Set-Cookie' in response.headers
+                        or '*' in vary or 'cookie' in vary):
+                    self.cache.set(
+                        cache_key,
+                        (response.get_data(), response.status_code, list(response.headers)),
+                        timeout=timeout
+                    )
                 
                 return response
             
@@ -277,18 +529,68 @@ class ResponseCache:
 class AssetOptimizer:
     """Static asset optimization"""
     
+    # Outside debug mode each app keeps a manifest of relative static path ->
+    # mtime in app.extensions, built on the first lookup; a deploy or worker
+    # restart picks up new assets
+    MANIFEST_EXTENSION = 'asset_manifest'
+    
+    # In debug mode, each (static folder, asset) is stat()ed at most once per TTL
+    _mtime_cache = {}
+    MTIME_TTL = 1.0
+    
+    @staticmethod
+    def build_manifest(static_folder):
+        """Walk the static folder once and record every file's mtime"""
+        manifest = {}
+        pending = [(static_folder, '')]
+        while pending:
+            directory, prefix = pending.pop()
+            try:
+                entries = os.scandir(directory)
+            except OSError:
+                continue
+            with entries:
+                for entry in entries:
+                    name = prefix + entry.name
+                    if entry.is_dir(follow_symlinks=True):
+                        pending.append((entry.path, name + '/'))
+                    else:
+                        try:
+                            manifest[name] = int(entry.stat().st_mtime)
+                        except OSError:
+                            continue
+        return manifest
+    
     @staticmethod
     def get_asset_version(asset_path):
         """Get asset version for cache busting"""
+        app = current_app._get_current_object()
+        if not app.static_folder:
+            return 1
+        
+        if not app.debug:
+            manifest = app.extensions.get(AssetOptimizer.MANIFEST_EXTENSION)
+            if manifest is None:
+                manifest = app.extensions.setdefault(
+                    AssetOptimizer.MANIFEST_EXTENSION,
+                    AssetOptimizer.build_manifest(app.static_folder)
+                )
+            return manifest.get(asset_path.lstrip('/'), 1)
+        
+        # Debug mode stats assets so edits are picked up immediately
+        now = time.monotonic()
+        cache_key = (app.static_folder, asset_path)
+        cached = AssetOptimizer._mtime_cache.get(cache_key)
+        if cached is not None and now - cached[0] < AssetOptimizer.MTIME_TTL:
+            return cached[1]
+        
         try:
-            import os
-            full_path = os.path.join(current_app.static_folder, asset_path.lstrip('/'))
-            if os.path.exists(full_path):
-                mtime = os.path.getmtime(full_path)
-                return int(mtime)
-        except:
-            pass
-        return 1
+            full_path = os.path.join(app.static_folder, asset_path.lstrip('/'))
+            version = int(os.stat(full_path).st_mtime)
+        except OSError:
+            version = 1
+        AssetOptimizer._mtime_cache[cache_key] = (now, version)
+        return version
     
     @staticmethod
     def get_asset_url(asset_path):
@@ -303,18 +605,36 @@ class ConnectionPoolOptimizer:
     """Database connection pooling optimization"""
     
     @staticmethod
-    def get_optimized_engine(database_url, pool_size=10, max_overflow=20):
-        """Get optimized database engine"""
+    def get_optimized_engine(database_url, pool_size=10, max_overflow=20,
+                             pre_ping=False, statement_timeout_ms=None):
+        """Get optimized database engine
+        
+        pool_pre_ping adds a round-trip to every checkout; pool_recycle already
+        retires stale connections, so only enable pre_ping on unreliable networks.
+        The PostgreSQL statement timeout is off unless passed in or set through
+        DB_STATEMENT_TIMEOUT_MS.
+        """
+        from flask import has_app_context
         from sqlalchemy import create_engine
         from sqlalchemy.pool import QueuePool
         
+        if statement_timeout_ms is None and has_app_context():
+            statement_timeout_ms = current_app.config.get('DB_STATEMENT_TIMEOUT_MS')
+        
+        connect_args = {}
+        if statement_timeout_ms and database_url.startswith('postgresql'):
+            # Bound worst-case query latency on the server side
+            connect_args['options'] = f"-c statement_timeout={int(statement_timeout_ms)}"
+        
         engine = create_engine(
             database_url,
             poolclass=QueuePool,
             pool_size=pool_size,
             max_overflow=max_overflow,
-            pool_pre_ping=True,
+            pool_pre_ping=pre_ping,
+            pool_use_lifo=True,  # Reuse warm connections, let idle ones expire
             pool_recycle=3600,  # Recycle connections every hour
+            connect_args=connect_args,
             echo=False  # Disable SQL logging in production
         )
         
@@ -339,17 +659,6 @@ class MemoryOptimizer:
             }
         except ImportError:
             return {}
-    
-    @staticmethod
-    def optimize_large_objects(obj):
-        """Optimize large objects in memory"""
-        if hasattr(obj, '__dict__'):
-            # Clear unnecessary attributes
-            for attr in list(obj.__dict__.keys()):
-                if attr.startswith('_'):
-                    delattr(obj, attr)
-        
-        return obj
 
 # Performance Monitoring Decorators
 def monitor_performance(threshold=2.0):
@@ -357,27 +666,20 @@ def monitor_performance(threshold=2.0):
     def decorator(f):
         @functools.wraps(f)
         def decorated_function(*args, **kwargs):
-            start_time = time.time()
+            start_time = time.perf_counter()
             
             try:
                 result = f(*args, **kwargs)
-                duration = time.time() - start_time
-                
-                if duration > threshold:
-                    if hasattr(current_app, 'performance_logger'):
-                        current_app.performance_logger.warning(
-                            f"Slow function: {f.__name__} - {duration:.3f}s"
-                        )
-                
-                return result
-            
             except Exception as e:
-                duration = time.time() - start_time
-                if hasattr(current_app, 'performance_logger'):
-                    current_app.performance_logger.error(
-                        f"Function error: {f.__name__} - {duration:.3f}s - {str(e)}"
-                    )
+                duration = time.perf_counter() - start_time
+                perf_logger.error(f"Function error: {f.__name__} - {duration:.3f}s - {str(e)}")
                 raise
+            
+            duration = time.perf_counter() - start_time
+            if duration > threshold:
+                perf_logger.warning(f"Slow function: {f.__name__} - {duration:.3f}s")
+            
+            return result
         
         return decorated_function
     return decorator
@@ -385,13 +687,21 @@ def monitor_performance(threshold=2.0):
 def cache_function_result(timeout=300, key_func=None):
     """Cache function results"""
     def decorator(f):
+        # Specialize the key builder once per decorated function so calls
+        # neither branch on key_func nor rebuild the prefix
+        if key_func:
+            def build_key(args, kwargs):
+                return key_func(*args, **kwargs)
+        else:
+            prefix = f"func:{f.__module__}.{f.__qualname__}"
+            def build_key(args, kwargs):
+                return make_cache_key(prefix, args, kwargs)
+        
         @functools.wraps(f)
         def decorated_function(*args, **kwargs):
-            from flask import current_app
-            
             # Try to get cache (Redis or Flask-Cache)
-            cache = current_app.extensions.get('cache')
-            if not cache:
+            cache = get_cache()
+            if cache is None:
                 # Fallback to performance optimizer's memory cache
                 perf_optimizer = current_app.extensions.get('performance_optimizer')
                 if perf_optimizer and hasattr(perf_optimizer, '_memory_cache'):
@@ -401,10 +711,7 @@ def cache_function_result(timeout=300, key_func=None):
                     return f(*args, **kwargs)
             
             # Generate cache key
-            if key_func:
-                cache_key = key_func(*args, **kwargs)
-            else:
-                cache_key = f"func:{f.__name__}:{hash(str(args) + str(kwargs))}"
+            cache_key = build_key(args, kwargs)
             
             # Try to get cached result
             try:
@@ -435,6 +742,8 @@ def cache_function_result(timeout=300, key_func=None):
 class LazyLoader:
     """Lazy loading for expensive operations"""
     
+    __slots__ = ('load_func', 'args', 'kwargs', '_loaded', '_value')
+    
     def __init__(self, load_func, *args, **kwargs):
         self.load_func = load_func
         self.args = args
@@ -458,19 +767,64 @@ class PaginationOptimizer:
     """Optimized pagination"""
     
     @staticmethod
-    def get_paginated_query(query, page, per_page=20, max_per_page=100):
-        """Get optimized paginated query"""
+    def count_query(query):
+        """Count the rows a query returns without its ORDER BY
+        
+        Counting a subquery of the statement keeps LIMIT, GROUP BY and
+        DISTINCT semantics intact.
+        """
+        from sqlalchemy import func, select
+        
+        statement = query.statement.order_by(None)
+        return query.session.execute(
+            select(func.count()).select_from(statement.subquery())
+        ).scalar()
+    
+    @staticmethod
+    def get_paginated_query(query, page, per_page=20, max_per_page=100, count=True, window=True):
+        """Get optimized paginated query
+        
+        With count=False the total is not computed; one extra row is fetched
+        to determine has_next, which suits endless-scroll views.
+        
+        Single-entity queries fetch the page and its total in one round-trip
+        with COUNT(*) OVER (). The window counts rows before DISTINCT, so pass
+        window=False for DISTINCT queries to count them separately.
+        """
         # Validate per_page
         per_page = min(max(per_page, 1), max_per_page)
         
         # Calculate offset
         offset = (page - 1) * per_page
         
-        # Get total count efficiently
-        total = query.count()
+        if not count:
+            items = query.offset(offset).limit(per_page + 1).all()
+            has_next = len(items) > per_page
+            return {
+                'items': items[:per_page],
+                'total': None,
+                'pages': None,
+                'current_page': page,
+                'per_page': per_page,
+                'has_prev': page > 1,
+                'has_next': has_next
+            }
         
-        # Apply pagination
-        items = query.offset(offset).limit(per_page).all()
+        if window and len(query.column_descriptions) == 1:
+            from sqlalchemy import func
+            rows = query.add_columns(func.count().over().label('_total')) \
+                .offset(offset).limit(per_page).all()
+            items = [row[0] for row in rows]
+            if rows:
+                total = rows[0]._total
+            elif page > 1:
+                # Past the last page: no row carries the total
+                total = PaginationOptimizer.count_query(query)
+            else:
+                total = 0
+        else:
+            total = PaginationOptimizer.count_query(query)
+            items = query.offset(offset).limit(per_page).all()
         
         return {
             'items': items,
@@ -1,24 +1,61 @@
 """Security-related utility functions."""
-import re
+import weakref
 from datetime import datetime, timedelta
 from flask import current_app, request
 from flask_limiter import RateLimitExceeded
 
+# Character classes for is_strong_password. The UTF-8 encoded password is
+# mapped byte-for-byte to its class in one C-level translate() pass; every
+# non-ASCII byte counts as special, as with the old [^A-Za-z0-9] check.
+_UPPER, _LOWER, _NUMBER, _SPECIAL = 1, 2, 3, 4
+
+def _char_class(byte):
+    if 65 <= byte <= 90:
+        return _UPPER
+    if 97 <= byte <= 122:
+        return _LOWER
+    if 48 <= byte <= 57:
+        return _NUMBER
+    return _SPECIAL
+
+_CHAR_CLASS_TABLE = bytes(_char_class(byte) for byte in range(256))
+
+# Password policy per app, read from config on first use
+_password_policies = weakref.WeakKeyDictionary()
+
+def _password_policy():
+    """Return the current app's (min_length, upper, lower, number, special) policy."""
+    app = current_app._get_current_object()
+    policy = _password_policies.get(app)
+    if policy is None:
+        config = app.config
+        policy = _password_policies[app] = (
+            config.get('PASSWORD_MIN_LENGTH', 12),
+            config.get('PASSWORD_REQUIRE_UPPERCASE', True),
+            config.get('PASSWORD_REQUIRE_LOWERCASE', True),
+            config.get('PASSWORD_REQUIRE_NUMBER', True),
+            config.get('PASSWORD_REQUIRE_SPECIAL', True)
+        )
+    return policy
+
 def is_strong_password(password):
     """Check if the password meets strength requirements."""
-    if len(password) < current_app.config.get('PASSWORD_MIN_LENGTH', 12):
-        return False, 'Password must be at least 12 characters long'
+    min_length, require_upper, require_lower, require_number, require_special = _password_policy()
+    if len(password) < min_length:
+        return False, f'Password must be at least {min_length} characters long'
+    
+    classes = set(password.encode('utf-8', 'surrogatepass').translate(_CHAR_CLASS_TABLE))
     
-    if current_app.config.get('PASSWORD_REQUIRE_UPPERCASE', True) and not re.search(r'[A-Z]', password):
+    if require_upper and _UPPER not in classes:
         return False, 'Password must contain at least one uppercase letter'
         
-    if current_app.config.get('PASSWORD_REQUIRE_LOWERCASE', True) and not re.search(r'[a-z]', password):
+    if require_lower and _LOWER not in classes:
         return False, 'Password must contain at least one lowercase letter'
         
-    if current_app.config.get('PASSWORD_REQUIRE_NUMBER', True) and not re.search(r'[0-9]', password):
+    if require_number and _NUMBER not in classes:
         return False, 'Password must contain at least one number'
         
-    if current_app.config.get('PASSWORD_REQUIRE_SPECIAL', True) and not re.search(r'[^A-Za-z0-9]', password):
+    if require_special and _SPECIAL not in classes:
         return False, 'Password must contain at least one special character'
     
     return True, ''
@@ -33,9 +70,11 @@ def check_rate_limit():
         return False, f'Rate limit exceeded. Please try again in {e.retry_after} seconds'
 
 def get_client_ip():
-    """Get the client's IP address."""
-    if request.headers.getlist("X-Forwarded-For"):
-        return request.headers.getlist("X-Forwarded-For")[0]
+    """Get the client's IP address.
+    
+    Forwarded headers are resolved by ProxyFix for trusted proxies only
+    (PROXY_FIX_HOPS), so remote_addr is already the client address.
+    """
     return request.remote_addr
 
 def generate_csrf_token():
@@ -5,17 +5,96 @@ Provides comprehensive security measures and protection
 
 import time
 import hashlib
+import json
 import re
 import logging
 import os
+import queue
+import atexit
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from collections import OrderedDict, deque
 from datetime import datetime, timedelta
 from functools import wraps
-from flask import current_app, request, session, redirect, url_for, flash, jsonify
+from flask import current_app, request, session, redirect, url_for, flash, jsonify, abort
 from flask_login import current_user
 from werkzeug.security import generate_password_hash
 import bleach
 import secrets
 
+# Optional Rust-backed HTML sanitizer; bleach is used when it is missing
+try:
+    import nh3
+    NH3_AVAILABLE = True
+except ImportError:
+    NH3_AVAILABLE = False
+    nh3 = None
+
+# Optional Redis dependency
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+    redis = None
+
+# Sliding-window check run atomically in Redis so every worker shares the
+# same attempt log: drop expired entries, refuse at the limit, else record.
+# Returns {allowed, attempts in window}.
+RATE_LIMIT_LUA = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+local attempts = redis.call('ZCARD', KEYS[1])
+if attempts >= tonumber(ARGV[2]) then
+    return {0, attempts}
+end
+redis.call('ZADD', KEYS[1], ARGV[3], ARGV[5])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return {1, attempts + 1}
+"""
+
+# Validation patterns, compiled once at import
+_DIGIT_RE = re.compile(r'\d')
+_EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+_USERNAME_RE = re.compile(r'^[a-zA-Z0-9_-]+$')
+# Deletes path/shell metacharacters and C0/C1 control characters in one pass
+_FILENAME_TRANS = str.maketrans('', '', '<>:"/\\|?*' + ''.join(map(chr, range(0x20))) + ''.join(map(chr, range(0x7f, 0xa0))))
+
+# Common password fragments, matched in one scan of the lowercased password
+COMMON_PASSWORD_PATTERNS = (
+    '123456', 'password', 'qwerty', 'admin', 'letmein',
+    'welcome', 'monkey', 'dragon', 'master', 'sunshine'
+)
+_COMMON_PATTERN_RE = re.compile('|'.join(map(re.escape, COMMON_PASSWORD_PATTERNS)))
+
+# Password character classes as bits. Each UTF-8 byte maps to its class bit
+# through a 256-entry table, so one translate() pass classifies the password.
+_LOWER, _UPPER, _DIGIT, _SPECIAL = 1, 2, 4, 8
+_PASSWORD_SPECIALS = '!@#$%^&*(),.?":{}|<>'
+
+def _class_bit(byte):
+    char = chr(byte)
+    if 'a' <= char <= 'z':
+        return _LOWER
+    if 'A' <= char <= 'Z':
+        return _UPPER
+    if '0' <= char <= '9':
+        return _DIGIT
+    if char in _PASSWORD_SPECIALS:
+        return _SPECIAL
+    return 0
+
+_CLASS_TABLE = bytes(_class_bit(byte) if byte < 128 else 0 for byte in range(256))
+
+def _password_classes(password):
+    """Return the bitmask of character classes present in password"""
+    mask = 0
+    for bit in set(password.encode('utf-8', 'surrogatepass').translate(_CLASS_TABLE)):
+        mask |= bit
+    # \d also accepts non-ASCII digits
+    if not mask & _DIGIT and not password.isascii() and _DIGIT_RE.search(password):
+        mask |= _DIGIT
+    return mask
+
 class SecurityEnhancer:
     """Enhanced security protection system"""
     
@@ -52,6 +131,16 @@ class SecurityEnhancer:
             
             return response
         
+        # Share rate-limit state across workers when Redis is enabled
+        if REDIS_AVAILABLE and app.config.get('REDIS_ENABLED'):
+            try:
+                client = redis.from_url(app.config.get('REDIS_URL', 'redis://localhost:6379'))
+                client.ping()
+                rate_limiter.use_redis(client)
+                app.logger.info("Redis connected for rate limiting")
+            except Exception as e:
+                app.logger.warning(f"Redis not available for rate limiting: {e}")
+        
         # Log security events
         self.setup_security_logging(app)
     
@@ -68,24 +157,34 @@ class SecurityEnhancer:
             handler.setFormatter(logging.Formatter(
                 '%(asctime)s - SECURITY - %(levelname)s - %(message)s'
             ))
-            security_logger.addHandler(handler)
+            # Requests only enqueue records; a listener thread does the file I/O
+            log_queue = queue.Queue(-1)
+            listener = QueueListener(log_queue, handler, respect_handler_level=True)
+            listener.start()
+            atexit.register(listener.stop)
+            security_logger.addHandler(QueueHandler(log_queue))
             security_logger.setLevel(logging.INFO)
         
         app.security_logger = security_logger
     
     def log_security_event(self, event_type, details, severity='INFO'):
         """Log security events"""
-        event_data = {
-            'timestamp': datetime.utcnow().isoformat(),
-            'event_type': event_type,
-            'details': details,
-            'user_id': current_user.id if current_user.is_authenticated else None,
-            'ip': request.remote_addr,
-            'user_agent': request.headers.get('User-Agent', ''),
-            'severity': severity
-        }
-        
-        current_app.security_logger.info(f"Security Event: {event_data}")
+        security_logger = current_app.security_logger
+        if security_logger.isEnabledFor(logging.INFO):
+            event_data = {
+                'timestamp': datetime.utcnow().isoformat(),
+                'event_type': event_type,
+                'details': details,
+                'user_id': current_user.id if current_user.is_authenticated else None,
+                'ip': request.remote_addr,
+                'user_agent': request.headers.get('User-Agent', ''),
+                'severity': severity
+            }
+            # One JSON object per event so log tooling can parse fields directly
+            security_logger.info(
+                "Security Event: %s",
+                json.dumps(event_data, separators=(',', ':'), default=str)
+            )
         
         # Log critical events to main logger
         if severity in ['CRITICAL', 'HIGH']:
@@ -107,59 +206,60 @@ class PasswordSecurity:
             errors.append("Password must be less than 128 characters long")
         
         # Character requirements
-        if not re.search(r'[a-z]', password):
+        classes = _password_classes(password)
+        if not classes & _LOWER:
             errors.append("Password must contain at least one lowercase letter")
         
-        if not re.search(r'[A-Z]', password):
+        if not classes & _UPPER:
             errors.append("Password must contain at least one uppercase letter")
         
-        if not re.search(r'\d', password):
+        if not classes & _DIGIT:
             errors.append("Password must contain at least one digit")
         
-        if not re.search(r'[!@#$%^&*(),.?":{}|<>]', password):
+        if not classes & _SPECIAL:
             errors.append("Password must contain at least one special character")
         
         # Common patterns
-        common_patterns = [
-            r'123456', r'password', r'qwerty', r'admin', r'letmein',
-            r'welcome', r'monkey', r'dragon', r'master', r'sunshine'
-        ]
-        
-        for pattern in common_patterns:
-            if pattern.lower() in password.lower():
-                errors.append(f"Password contains common pattern: {pattern}")
-                break
+        lowered = password.lower()
+        common = _COMMON_PATTERN_RE.search(lowered)
+        if common:
+            errors.append(f"Password contains common pattern: {common.group()}")
         
         # Check against user data if provided
         if user_data:
-            if user_data.get('email') and user_data['email'].split('@')[0].lower() in password.lower():
+            if user_data.get('email') and user_data['email'].split('@')[0].lower() in lowered:
                 errors.append("Password cannot contain your email username")
             
-            if user_data.get('username') and user_data['username'].lower() in password.lower():
+            if user_data.get('username') and user_data['username'].lower() in lowered:
                 errors.append("Password cannot contain your username")
         
         return {
             'is_strong': len(errors) == 0,
             'errors': errors,
-            'strength_score': PasswordSecurity.calculate_strength_score(password)
+            'strength_score': PasswordSecurity._strength_score(password, classes)
         }
     
     @staticmethod
     def calculate_strength_score(password):
         """Calculate password strength score (0-100)"""
+        return PasswordSecurity._strength_score(password, _password_classes(password))
+    
+    @staticmethod
+    def _strength_score(password, classes):
+        """Score a password whose character classes are already known"""
         score = 0
         
         # Length contribution
         score += min(len(password) * 2, 40)  # Max 40 points for length
         
         # Character variety
-        if re.search(r'[a-z]', password):
+        if classes & _LOWER:
             score += 10
-        if re.search(r'[A-Z]', password):
+        if classes & _UPPER:
             score += 10
-        if re.search(r'\d', password):
+        if classes & _DIGIT:
             score += 10
-        if re.search(r'[!@#$%^&*(),.?":{}|<>]', password):
+        if classes & _SPECIAL:
             score += 15
         
         # Complexity bonus
@@ -191,6 +291,16 @@ class InputValidator:
                 '*': ['class']
             }
         
+        if NH3_AVAILABLE:
+            # Same policy as bleach: bleach's default URL schemes, no added rel
+            return nh3.clean(
+                content,
+                tags=set(allowed_tags),
+                attributes={tag: set(attrs) for tag, attrs in allowed_attributes.items()},
+                url_schemes={'http', 'https', 'mailto'},
+                link_rel=None
+            )
+        
         return bleach.clean(
             content,
             tags=allowed_tags,
@@ -201,8 +311,10 @@ class InputValidator:
     @staticmethod
     def validate_email(email):
         """Validate email format"""
-        pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        return re.match(pattern, email) is not None
+        # Cheap rejects first; 254 is the RFC 5321 address length limit
+        if '@' not in email or len(email) > 254:
+            return False
+        return _EMAIL_RE.match(email) is not None
     
     @staticmethod
     def validate_username(username):
@@ -211,17 +323,13 @@ class InputValidator:
             return False
         
         # Only allow alphanumeric, underscore, and hyphen
-        pattern = r'^[a-zA-Z0-9_-]+$'
-        return re.match(pattern, username) is not None
+        return _USERNAME_RE.match(username) is not None
     
     @staticmethod
     def sanitize_filename(filename):
         """Sanitize filename for security"""
-        # Remove dangerous characters
-        filename = re.sub(r'[<>:"/\\|?*]', '', filename)
-        
-        # Remove control characters
-        filename = re.sub(r'[\x00-\x1f\x7f-\x9f]', '', filename)
+        # Remove dangerous and control characters
+        filename = filename.translate(_FILENAME_TRANS)
         
         # Limit length
         if len(filename) > 255:
@@ -234,36 +342,80 @@ class InputValidator:
 class RateLimiter:
     """Enhanced rate limiting"""
     
-    def __init__(self):
-        self.attempts = {}
+    # Least recently used keys are evicted past this many, bounding memory
+    # when many addresses are seen
+    MAX_KEYS = 10000
+    
+    def __init__(self, max_keys=MAX_KEYS):
+        self.attempts = OrderedDict()
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self.redis_client = None
+        self._script = None
+    
+    def use_redis(self, client):
+        """Keep attempts in Redis instead of process memory"""
+        self.redis_client = client
+        # Loaded lazily via EVALSHA, re-sent automatically on NOSCRIPT
+        self._script = client.register_script(RATE_LIMIT_LUA)
     
     def is_allowed(self, key, limit, window=3600):
         """Check if action is allowed"""
         now = time.time()
+        cutoff = now - window
         
-        if key not in self.attempts:
-            self.attempts[key] = []
-        
-        # Clean old attempts
-        self.attempts[key] = [attempt for attempt in self.attempts[key] if now - attempt < window]
-        
-        # Check limit
-        if len(self.attempts[key]) >= limit:
-            return False
-        
-        # Record attempt
-        self.attempts[key].append(now)
-        return True
+        if self._script is not None:
+            try:
+                allowed, _ = self._script(
+                    keys=[f"ratelimit:{key}"],
+                    args=[cutoff, limit, now, int(window) + 1, f"{now}:{secrets.token_hex(4)}"]
+                )
+                return bool(allowed)
+            except Exception as e:
+                logging.getLogger('security').warning(f"Redis rate limiting failed: {e}")
+        
+        with self._lock:
+            attempts = self.attempts.get(key)
+            if attempts is None:
+                attempts = self.attempts[key] = deque()
+                if len(self.attempts) > self.max_keys:
+                    self.attempts.popitem(last=False)
+            else:
+                self.attempts.move_to_end(key)
+            
+            # Attempts are in time order, so expired ones are at the front
+            while attempts and attempts[0] <= cutoff:
+                attempts.popleft()
+            
+            # Check limit
+            if len(attempts) >= limit:
+                return False
+            
+            # Record attempt
+            attempts.append(now)
+            return True
+    
+    def count_attempts(self, key, window=3600):
+        """Count attempts recorded for key within the window"""
+        cutoff = time.time() - window
+        
+        if self.redis_client is not None:
+            try:
+                return self.redis_client.zcount(f"ratelimit:{key}", f"({cutoff}", '+inf')
+            except Exception:
+                pass
+        
+        attempts = self.attempts.get(key)
+        if attempts is None:
+            return 0
+        return sum(1 for attempt in list(attempts) if attempt > cutoff)
     
     def get_remaining_attempts(self, key, limit, window=3600):
         """Get remaining attempts"""
-        now = time.time()
-        
-        if key not in self.attempts:
-            return limit
-        
-        recent_attempts = [attempt for attempt in self.attempts[key] if now - attempt < window]
-        return max(0, limit - len(recent_attempts))
+        return max(0, limit - self.count_attempts(key, window))
+
+# Shared by rate_limit and SecurityMonitor so attempts accumulate across requests
+rate_limiter = RateLimiter()
 
 # Session Security
 class SessionSecurity:
@@ -308,32 +460,52 @@ def require_csrf_token(f):
     """Require CSRF token for sensitive operations"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if request.method in ['POST', 'PUT', 'DELETE']:
-            token = session.get('csrf_token')
-            form_token = request.form.get('csrf_token')
-            header_token = request.headers.get('X-CSRF-Token')
-            
-            submitted_token = form_token or header_token
-            
-            if not token or not submitted_token or not hmac.compare_digest(token, submitted_token):
-                if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-                    return jsonify({'success': False, 'error': 'Invalid CSRF token'}), 403
-                abort(403)
+        if request.method not in ('POST', 'PUT', 'DELETE'):
+            return f(*args, **kwargs)
+        
+        token = session.get('csrf_token')
+        submitted_token = request.form.get('csrf_token') or request.headers.get('X-CSRF-Token')
+        
+        if not token or not submitted_token or not secrets.compare_digest(token, submitted_token):
+            if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+                return jsonify({'success': False, 'error': 'Invalid CSRF token'}), 403
+            abort(403)
         
         return f(*args, **kwargs)
     return decorated_function
 
-def rate_limit(limit=100, window=3600, key_func=None):
-    """Rate limiting decorator"""
+_forwarded_warning_logged = False
+
+def rate_limit(limit=100, window=3600, key_func=None, methods=('POST', 'PUT', 'PATCH', 'DELETE')):
+    """Rate limiting decorator
+    
+    Only requests using one of methods count towards the limit, so viewing
+    a form does not use up its submissions. The default key is the client
+    address; X-Forwarded-For is only honoured through ProxyFix, so behind an
+    unconfigured proxy all clients share one limit rather than bypassing it.
+    """
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
+            global _forwarded_warning_logged
+            
+            if request.method not in methods or not current_app.config.get('RATELIMIT_ENABLED', True):
+                return f(*args, **kwargs)
+            
+            if (not _forwarded_warning_logged and 'X-Forwarded-For' in request.headers
+                    and not current_app.config.get('PROXY_FIX_HOPS')):
+                _forwarded_warning_logged = True
+                logging.getLogger('security').warning(
+                    "X-Forwarded-For received but PROXY_FIX_HOPS is not set; "
+                    "rate limits are keyed on the proxy address"
+                )
+            
             if key_func:
                 key = key_func()
             else:
                 key = f"{request.remote_addr}:{request.endpoint}"
             
-            limiter = RateLimiter()
+            limiter = rate_limiter
             
             if not limiter.is_allowed(key, limit, window):
                 remaining = limiter.get_remaining_attempts(key, limit, window)
@@ -363,8 +535,14 @@ def validate_input(validation_rules):
                 
             errors = {}
             
+            # Parse the body once for all fields
+            form = request.form
+            body = request.get_json(silent=True) if request.is_json else None
+            if not isinstance(body, dict):
+                body = None
+            
             for field, rules in validation_rules.items():
-                value = request.form.get(field) or request.json.get(field) if request.is_json else request.form.get(field)
+                value = (body.get(field) if body else None) or form.get(field)
                 
                 # Required validation
                 if rules.get('required', False) and not value:
@@ -413,14 +591,14 @@ class SecurityMonitor:
         if username:
             key += f":{username}"
         
-        limiter = RateLimiter()
+        limiter = rate_limiter
         
         # More than 5 failed attempts in 15 minutes is suspicious
         if not limiter.is_allowed(key, 5, 900):
             self.log_suspicious_activity('brute_force', {
                 'ip': ip_address,
                 'username': username,
-                'attempts': len(limiter.attempts.get(key, []))
+                'attempts': limiter.count_attempts(key, 900)
             })
             return True
         
@@ -429,13 +607,13 @@ class SecurityMonitor:
     def detect_mass_registration(self, ip_address):
         """Detect mass registration attempts"""
         key = f"registration:{ip_address}"
-        limiter = RateLimiter()
+        limiter = rate_limiter
         
         # More than 3 registrations in 10 minutes is suspicious
         if not limiter.is_allowed(key, 3, 600):
             self.log_suspicious_activity('mass_registration', {
                 'ip': ip_address,
-                'attempts': len(limiter.attempts.get(key, []))
+                'attempts': limiter.count_attempts(key, 600)
             })
             return True
         
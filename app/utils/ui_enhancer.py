@@ -3,11 +3,114 @@ UI/UX Enhancement System
 Provides comprehensive UI improvements and user experience optimizations
 """
 
+import bisect
+import functools
+import itertools
 import re
 from datetime import datetime
-from flask import current_app, request
+from types import MappingProxyType
+from flask import current_app, get_template_attribute, request, g
+from markupsafe import escape
 from typing import Dict, List, Any, Optional
 
+# User-Agent fragments that identify phones and tablets, matched in one scan
+MOBILE_PATTERNS = ('mobile', 'android', 'iphone', 'ipad', 'tablet')
+_MOBILE_UA_RE = re.compile('|'.join(MOBILE_PATTERNS), re.IGNORECASE)
+
+# Read-only lookup tables shared by every call
+ANIMATION_CLASSES = MappingProxyType({
+    'fade': 'animate-fade-in',
+    'slide': 'animate-slide-up',
+    'bounce': 'animate-bounce-in',
+    'scale': 'animate-scale-in'
+})
+
+MOOD_EMOJIS = MappingProxyType({
+    'happy': '😊',
+    'sad': '😢',
+    'angry': '😠',
+    'anxious': '😰',
+    'excited': '🎉',
+    'grateful': '🙏',
+    'peaceful': '😌',
+    'motivated': '💪',
+    'tired': '😴',
+    'confused': '😕',
+    'neutral': '😐'
+})
+
+MOOD_COLORS = MappingProxyType({
+    'happy': 'success',
+    'sad': 'info',
+    'angry': 'danger',
+    'anxious': 'warning',
+    'excited': 'primary',
+    'grateful': 'success',
+    'peaceful': 'info',
+    'motivated': 'primary',
+    'tired': 'secondary',
+    'confused': 'warning',
+    'neutral': 'light'
+})
+
+ACTIVITY_ICONS = MappingProxyType({
+    'entry_created': '📝',
+    'entry_updated': '✏️',
+    'entry_deleted': '🗑️',
+    'goal_achieved': '🎯',
+    'milestone_reached': '🏆',
+    'login': '👤',
+    'settings_updated': '⚙️'
+})
+
+CARD_SIZES = MappingProxyType({
+    'small': 'col-md-4 col-lg-3',
+    'medium': 'col-md-6 col-lg-4',
+    'large': 'col-md-8 col-lg-6',
+    'full': 'col-12'
+})
+
+TRANSITION_CLASSES = MappingProxyType({
+    'fade': 'transition-fade',
+    'slide': 'transition-slide',
+    'scale': 'transition-scale',
+    'rotate': 'transition-rotate'
+})
+
+# Upper bounds (seconds) of the "just now", minute, hour and day ranges, and
+# the (divisor, long name, short suffix) used for each range after the first
+_AGO_BOUNDS = (60, 3600, 86400, 604800)
+_AGO_UNITS = (None, (60, 'minute', 'm'), (3600, 'hour', 'h'), (86400, 'day', 'd'))
+
+def _time_ago(timestamp, short, now=None):
+    """Format a UTC timestamp relative to now, e.g. '3 hours ago' or '3h ago'"""
+    if not timestamp:
+        return 'Never'
+    
+    seconds = int(((now or datetime.utcnow()) - timestamp).total_seconds())
+    index = bisect.bisect_right(_AGO_BOUNDS, seconds)
+    if index == 0:
+        return 'Just now'
+    if index == len(_AGO_BOUNDS):
+        # Past a week the long form shows the date; the short form keeps counting days
+        if not short:
+            return timestamp.strftime('%b %d, %Y')
+        index -= 1
+    
+    divisor, name, suffix = _AGO_UNITS[index]
+    count = seconds // divisor
+    if short:
+        return f'{count}{suffix} ago'
+    return f'{count} {name}{"s" if count != 1 else ""} ago'
+
+@functools.lru_cache(maxsize=256)
+def _highlight_pattern(query):
+    """Compile the search-highlight pattern for a query, matched against escaped text"""
+    return re.compile(re.escape(str(escape(query))), re.IGNORECASE)
+
+def _mark_match(match):
+    return f'<mark>{match.group()}</mark>'
+
 class UIEnhancer:
     """Comprehensive UI/UX enhancement system"""
     
@@ -29,30 +132,14 @@ class UIEnhancer:
                 'is_mobile': self.is_mobile_request,
                 'get_animation_classes': self.get_animation_classes
             }
+        
+        # Used by the _macros.html activity_feed macro
+        app.jinja_env.filters['activity_icon'] = UIHelper.get_activity_icon
+        app.jinja_env.filters['time_ago'] = UIHelper.format_time_ago
     
     def format_date_ago(self, date):
         """Format date as 'X time ago'"""
-        if not date:
-            return 'Never'
-        
-        now = datetime.utcnow()
-        diff = now - date
-        
-        seconds = diff.total_seconds()
-        
-        if seconds < 60:
-            return 'Just now'
-        elif seconds < 3600:
-            minutes = int(seconds / 60)
-            return f'{minutes} minute{"s" if minutes != 1 else ""} ago'
-        elif seconds < 86400:
-            hours = int(seconds / 3600)
-            return f'{hours} hour{"s" if hours != 1 else ""} ago'
-        elif seconds < 604800:
-            days = int(seconds / 86400)
-            return f'{days} day{"s" if days != 1 else ""} ago'
-        else:
-            return date.strftime('%b %d, %Y')
+        return _time_ago(date, short=False)
     
     def format_file_size(self, size_bytes):
         """Format file size in human readable format"""
@@ -76,19 +163,16 @@ class UIEnhancer:
     
     def is_mobile_request(self):
         """Check if request is from mobile device"""
-        user_agent = request.headers.get('User-Agent', '').lower()
-        mobile_patterns = ['mobile', 'android', 'iphone', 'ipad', 'tablet']
-        return any(pattern in user_agent for pattern in mobile_patterns)
+        # Templates ask several times per render; the answer is fixed per request
+        is_mobile = g.get('_is_mobile')
+        if is_mobile is None:
+            user_agent = request.headers.get('User-Agent', '')
+            is_mobile = g._is_mobile = _MOBILE_UA_RE.search(user_agent) is not None
+        return is_mobile
     
     def get_animation_classes(self, animation_type='fade'):
         """Get animation CSS classes"""
-        animations = {
-            'fade': 'animate-fade-in',
-            'slide': 'animate-slide-up',
-            'bounce': 'animate-bounce-in',
-            'scale': 'animate-scale-in'
-        }
-        return animations.get(animation_type, 'animate-fade-in')
+        return ANIMATION_CLASSES.get(animation_type, 'animate-fade-in')
 
 class UIHelper:
     """UI helper functions for templates"""
@@ -96,38 +180,12 @@ class UIHelper:
     @staticmethod
     def get_mood_emoji(mood):
         """Get emoji for mood"""
-        mood_emojis = {
-            'happy': '😊',
-            'sad': '😢',
-            'angry': '😠',
-            'anxious': '😰',
-            'excited': '🎉',
-            'grateful': '🙏',
-            'peaceful': '😌',
-            'motivated': '💪',
-            'tired': '😴',
-            'confused': '😕',
-            'neutral': '😐'
-        }
-        return mood_emojis.get(mood.lower(), '😐')
+        return MOOD_EMOJIS.get(mood.lower() if mood else '', '😐')
     
     @staticmethod
     def get_mood_color(mood):
         """Get color for mood"""
-        mood_colors = {
-            'happy': 'success',
-            'sad': 'info',
-            'angry': 'danger',
-            'anxious': 'warning',
-            'excited': 'primary',
-            'grateful': 'success',
-            'peaceful': 'info',
-            'motivated': 'primary',
-            'tired': 'secondary',
-            'confused': 'warning',
-            'neutral': 'light'
-        }
-        return mood_colors.get(mood.lower(), 'secondary')
+        return MOOD_COLORS.get(mood.lower() if mood else '', 'secondary')
     
     @staticmethod
     def truncate_text(text, length=100, suffix='...'):
@@ -141,12 +199,12 @@ class UIHelper:
         """Count words in text"""
         if not text:
             return 0
-        return len(re.findall(r'\b\w+\b', text))
+        return len(text.split())
     
     @staticmethod
     def reading_time(text):
         """Estimate reading time in minutes"""
-        words = UIHelper.word_count(text)
+        words = len(text.split()) if text else 0
         # Average reading speed: 200 words per minute
         minutes = max(1, round(words / 200))
         return f"{minutes} min read"
@@ -160,17 +218,8 @@ class UIHelper:
     
     @staticmethod
     def get_streak_badge(streak_count):
-        """Get streak badge HTML"""
-        if streak_count >= 30:
-            return '<span class="badge bg-danger">🔥 {streak} days</span>'
-        elif streak_count >= 14:
-            return '<span class="badge bg-warning">⭐ {streak} days</span>'
-        elif streak_count >= 7:
-            return '<span class="badge bg-info">📈 {streak} days</span>'
-        elif streak_count >= 3:
-            return '<span class="badge bg-success">📝 {streak} days</span>'
-        else:
-            return '<span class="badge bg-secondary">{streak} days</span>'
+        """Get streak badge HTML from the _macros.html streak_badge macro"""
+        return get_template_attribute('_macros.html', 'streak_badge')(streak_count)
     
     @staticmethod
     def format_search_highlight(text, query):
@@ -178,12 +227,11 @@ class UIHelper:
         if not query:
             return text
         
-        # Escape HTML special characters
-        text = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+        # Escape HTML special characters (markupsafe's C speedups, as Jinja uses)
+        text = str(escape(text))
         
-        # Highlight matching terms
-        pattern = re.compile(re.escape(query), re.IGNORECASE)
-        highlighted = pattern.sub(f'<mark>{query}</mark>', text)
+        # Highlight matching terms, keeping the text's own (escaped) casing
+        highlighted = _highlight_pattern(query).sub(_mark_match, text)
         
         return highlighted
     
@@ -199,75 +247,22 @@ class UIHelper:
         
         return f"{mood_emoji} {preview}"
     
-    @staticmethod
-    def get_entry_tags_html(tags):
-        """Get formatted tags HTML"""
-        if not tags:
-            return ''
-        
-        tag_html = []
-        for tag in tags[:5]:  # Limit to 5 tags
-            tag_html.append(f'<span class="badge bg-light text-dark me-1">#{tag.name}</span>')
-        
-        return ' '.join(tag_html)
-    
     @staticmethod
     def get_activity_feed_html(activities):
-        """Get formatted activity feed HTML"""
-        feed_html = []
-        
-        for activity in activities[:10]:  # Show last 10 activities
-            icon = UIHelper.get_activity_icon(activity['type'])
-            time_ago = UIHelper.format_time_ago(activity['timestamp'])
-            
-            feed_html.append(f'''
-                <div class="d-flex align-items-center mb-3">
-                    <div class="me-3">{icon}</div>
-                    <div class="flex-grow-1">
-                        <div class="small">{activity['description']}</div>
-                        <div class="text-muted tiny">{time_ago}</div>
-                    </div>
-                </div>
-            ''')
-        
-        return ''.join(feed_html)
+        """Get activity feed HTML from the _macros.html activity_feed macro"""
+        activity_feed = get_template_attribute('_macros.html', 'activity_feed')
+        # Show last 10 activities
+        return activity_feed(list(itertools.islice(activities, 10)), datetime.utcnow())
     
     @staticmethod
     def get_activity_icon(activity_type):
         """Get icon for activity type"""
-        icons = {
-            'entry_created': '📝',
-            'entry_updated': '✏️',
-            'entry_deleted': '🗑️',
-            'goal_achieved': '🎯',
-            'milestone_reached': '🏆',
-            'login': '👤',
-            'settings_updated': '⚙️'
-        }
-        return icons.get(activity_type, '📌')
+        return ACTIVITY_ICONS.get(activity_type, '📌')
     
     @staticmethod
-    def format_time_ago(timestamp):
-        """Format timestamp as time ago"""
-        if not timestamp:
-            return 'Never'
-        
-        now = datetime.utcnow()
-        diff = now - timestamp
-        
-        seconds = diff.total_seconds()
-        
-        if seconds < 60:
-            return 'Just now'
-        elif seconds < 3600:
-            minutes = int(seconds / 60)
-            return f'{minutes}m ago'
-        elif seconds < 86400:
-            hours = int(seconds / 3600)
-            return f'{hours}h ago'
-        else:
-            days = int(seconds / 86400)
-            return f'{days}d ago'
+    def format_time_ago(timestamp, now=None):
+        """Format timestamp as time ago, relative to now (UTC) if given"""
+        return _time_ago(timestamp, short=True, now=now)
 
 class ResponsiveHelper:
     """Responsive design helper"""
@@ -287,25 +282,25 @@ class ResponsiveHelper:
     @staticmethod
     def get_card_size(content_size='medium'):
         """Get appropriate card size based on content"""
-        sizes = {
-            'small': 'col-md-4 col-lg-3',
-            'medium': 'col-md-6 col-lg-4',
-            'large': 'col-md-8 col-lg-6',
-            'full': 'col-12'
-        }
-        return sizes.get(content_size, 'col-md-6 col-lg-4')
+        return CARD_SIZES.get(content_size, 'col-md-6 col-lg-4')
     
     @staticmethod
     def get_breakpoint_class():
         """Get current breakpoint class"""
+        breakpoint = g.get('_breakpoint')
+        if breakpoint is not None:
+            return breakpoint
+        
         user_agent = request.headers.get('User-Agent', '').lower()
         
         if 'mobile' in user_agent:
-            return 'device-mobile'
+            breakpoint = 'device-mobile'
         elif 'tablet' in user_agent or 'ipad' in user_agent:
-            return 'device-tablet'
+            breakpoint = 'device-tablet'
         else:
-            return 'device-desktop'
+            breakpoint = 'device-desktop'
+        g._breakpoint = breakpoint
+        return breakpoint
 
 class AnimationHelper:
     """Animation and transition helper"""
@@ -313,13 +308,7 @@ class AnimationHelper:
     @staticmethod
     def get_transition_classes(transition_type='fade'):
         """Get transition CSS classes"""
-        transitions = {
-            'fade': 'transition-fade',
-            'slide': 'transition-slide',
-            'scale': 'transition-scale',
-            'rotate': 'transition-rotate'
-        }
-        return transitions.get(transition_type, 'transition-fade')
+        return TRANSITION_CLASSES.get(transition_type, 'transition-fade')
     
     @staticmethod
     def get_animation_delay(index, base_delay=100):
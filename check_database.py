@@ -4,89 +4,168 @@ Check database status and users
 Run this to debug login issues
 """
 
-import os
 import sys
 
-# Add the app directory to the path
-sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+def _bootstrap():
+    """Add the app directory to the path when run as a script."""
+    import os
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from app import create_app, db
-from app.models.user import User
-from app.models.entry import Entry
+# Tables the app cannot run without; their row counts are fetched in one query
+REQUIRED_TABLES = ('users', 'entries')
+
+# Applied to each new SQLite connection by tune_sqlite(); connection-scoped only,
+# since journal_mode=WAL would persist into the database file
+SQLITE_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=memory",
+    "PRAGMA cache_size=-20000",
+)
+
+def tune_sqlite(engine):
+    """Apply sync and cache PRAGMAs to every new connection of a file-backed SQLite engine."""
+    if engine.dialect.name != 'sqlite' or engine.url.database in (None, '', ':memory:'):
+        return
+    
+    from sqlalchemy import event
+    
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+        cursor.close()
+    
+    # create_app() has already opened a connection; start from a fresh pool
+    engine.dispose()
 
 def check_database():
     """Check database status and contents."""
+    # Deferred so importing this module does not boot Flask and the models
+    from sqlalchemy import func, inspect, literal, select, table, text, union_all
+    from sqlalchemy.orm import Session
+    from app import create_app, db
+    from app.models.user import User
+    from app.models.entry import Entry
+    
     app = create_app()
     
     with app.app_context():
+        tune_sqlite(db.engine)
+        
         print("🔍 Database Health Check")
         print("=" * 50)
         
         # Check database connection
+        conn = None
         try:
-            db.engine.execute("SELECT 1")
+            conn = db.engine.connect()
+            conn.execute(text("SELECT 1"))
             print("✅ Database connection: OK")
         except Exception as e:
             print(f"❌ Database connection failed: {e}")
+            if conn is not None:
+                conn.close()
             return
         
-        # Check tables
-        try:
-            inspector = db.inspect(db.engine)
-            tables = inspector.get_table_names()
-            print(f"✅ Database tables: {len(tables)} found")
-            for table in tables:
-                print(f"   - {table}")
-        except Exception as e:
-            print(f"❌ Error checking tables: {e}")
-        
-        print("\n👥 Users Check")
-        print("-" * 30)
-        
-        users = User.query.all()
-        print(f"Total users: {len(users)}")
-        
-        for user in users:
-            print(f"\n📧 User: {user.email}")
-            print(f"   Username: {user.username}")
-            print(f"   ID: {user.id}")
-            print(f"   Active: {user.is_active}")
-            print(f"   Verified: {user.is_verified}")
-            print(f"   Created: {user.created_at}")
-            print(f"   Has password hash: {'Yes' if user.password_hash else 'No'}")
-            print(f"   Password hash length: {len(user.password_hash) if user.password_hash else 0}")
-        
-        print("\n📝 Entries Check")
-        print("-" * 30)
-        
-        entries = Entry.query.all()
-        print(f"Total entries: {len(entries)}")
-        
-        for entry in entries[:5]:  # Show first 5 entries
-            print(f"\n📄 Entry: {entry.title or 'Untitled'}")
-            print(f"   ID: {entry.id}")
-            print(f"   User ID: {entry.user_id}")
-            print(f"   Created: {entry.created_at}")
-            print(f"   Content length: {len(entry.content) if entry.content else 0}")
-        
-        if len(entries) > 5:
-            print(f"\n... and {len(entries) - 5} more entries")
-        
-        print("\n🔑 Login Test")
-        print("-" * 30)
-        
-        test_email = "kevohmutwiri9@gmail.com"
-        user = User.query.filter_by(email=test_email).first()
-        
-        if user:
-            print(f"✅ User found: {test_email}")
-            print(f"   Username: {user.username}")
-            print(f"   Account locked: {'Yes' if user.account_locked_until else 'No'}")
-            if user.account_locked_until:
-                print(f"   Locked until: {user.account_locked_until}")
-        else:
-            print(f"❌ User NOT found: {test_email}")
-            print("   This user needs to be created in the database!")
+        row_counts = {}
+        # Everything below reuses this one connection. pysqlite opens no transaction
+        # for SELECTs, so each query still sees the latest committed data
+        with conn, Session(bind=conn) as session:
+            # Check tables
+            try:
+                inspector = inspect(conn)
+                tables = inspector.get_table_names()
+                print(f"✅ Database tables: {len(tables)} found")
+                for table_name in tables:
+                    print(f"   - {table_name}")
+            except Exception as e:
+                print(f"❌ Error checking tables: {e}")
+            else:
+                # Login and maintenance lookups filter on users.email
+                if 'users' in tables:
+                    indexed = [ix['column_names'] for ix in inspector.get_indexes('users')]
+                    indexed += [uc['column_names'] for uc in inspector.get_unique_constraints('users')]
+                    if any(columns[:1] == ['email'] for columns in indexed):
+                        print("✅ users.email index: OK")
+                    else:
+                        print("⚠️  users.email is not indexed; email lookups will scan the table")
+                
+                present = [name for name in REQUIRED_TABLES if name in tables]
+                for name in REQUIRED_TABLES:
+                    if name not in present:
+                        print(f"❌ Required table missing: {name}")
+                if present:
+                    counts = union_all(*(
+                        select(literal(name), func.count()).select_from(table(name))
+                        for name in present
+                    ))
+                    row_counts = dict(conn.execute(counts).all())
+                    for name in present:
+                        print(f"✅ {name}: {row_counts[name]} rows")
+            
+            print("\n👥 Users Check")
+            print("-" * 30)
+            
+            users = session.execute(select(
+                User.email, User.username, User.id, User.created_at,
+                func.coalesce(func.length(User.password_hash), 0)
+            )).all()
+            print(f"Total users: {len(users)}")
+            
+            # Format the whole report in one pass and write it with a single call
+            sys.stdout.write(''.join(
+                f"\n📧 User: {email}\n"
+                f"   Username: {username}\n"
+                f"   ID: {user_id}\n"
+                f"   Created: {created_at}\n"
+                f"   Has password hash: {'Yes' if hash_length else 'No'}\n"
+                f"   Password hash length: {hash_length}\n"
+                for email, username, user_id, created_at, hash_length in users
+            ))
+            
+            print("\n📝 Entries Check")
+            print("-" * 30)
+            
+            total_entries = row_counts.get('entries')
+            if total_entries is None:
+                total_entries = session.scalar(select(func.count(Entry.id)))
+            print(f"Total entries: {total_entries}")
+            
+            entries = session.execute(select(
+                Entry.id, Entry.user_id, Entry.title, Entry.created_at,
+                func.coalesce(func.length(Entry.content), 0)
+            ).limit(5)).all()  # Show first 5 entries
+            
+            sys.stdout.write(''.join(
+                f"\n📄 Entry: {title or 'Untitled'}\n"
+                f"   ID: {entry_id}\n"
+                f"   User ID: {user_id}\n"
+                f"   Created: {created_at}\n"
+                f"   Content length: {content_length}\n"
+                for entry_id, user_id, title, created_at, content_length in entries
+            ))
+            
+            if total_entries > 5:
+                print(f"\n... and {total_entries - 5} more entries")
+            
+            print("\n🔑 Login Test")
+            print("-" * 30)
+            
+            test_email = "kevohmutwiri9@gmail.com"
+            user = session.scalar(select(User).where(User.email == test_email))
+            
+            if user:
+                print(f"✅ User found: {test_email}")
+                print(f"   Username: {user.username}")
+                print(f"   Account locked: {'Yes' if user.account_locked_until else 'No'}")
+                if user.account_locked_until:
+                    print(f"   Locked until: {user.account_locked_until}")
+            else:
+                print(f"❌ User NOT found: {test_email}")
+                print("   This user needs to be created in the database!")
 
 if __name__ == '__main__':
+    _bootstrap()
     check_database()
@@ -4,51 +4,115 @@ Comprehensive Test Suite
 Tests all aspects of the My Diary application
 """
 
-import os
 import sys
 import unittest
-import tempfile
 import json
 from datetime import datetime, timedelta
 from flask import Flask
+from werkzeug.exceptions import TooManyRequests
+from werkzeug.security import generate_password_hash
+from sqlalchemy import event, func
+from sqlalchemy.orm import scoped_session, sessionmaker
 from app import create_app, db
 from app.models.user import User
 from app.models.entry import Entry
+from app.utils.performance_optimizer import PaginationOptimizer, ResponseCache
+from app.utils.security_enhancer import rate_limit, rate_limiter
+from app.utils.ui_enhancer import UIHelper
 from config import TestingConfig
 
+# Hashed once at import; the fixture user is inserted with this hash
+# instead of running the slow password hasher for every test class
+TEST_PASSWORD = 'Test123!@#'
+TEST_PASSWORD_HASH = generate_password_hash(TEST_PASSWORD, method=TestingConfig.PASSWORD_HASH_METHOD)
+
+# Optional parallel runner; every test class builds its own in-memory
+# database, so classes can run on separate workers without sharing files
+try:
+    import pytest
+    import xdist  # noqa: F401 - provides pytest's -n option
+    XDIST_AVAILABLE = True
+except ImportError:
+    XDIST_AVAILABLE = False
+
 class MyDiaryTestCase(unittest.TestCase):
-    """Base test case for My Diary"""
+    """Base test case for My Diary
+    
+    The app, schema and test user are created once per class; each test gets a
+    fresh test client, so it starts logged out. Each test runs inside a
+    transaction on the shared in-memory connection that is rolled back
+    afterwards, so commits made by the app only release a savepoint.
+    """
+    
+    @classmethod
+    def setUpClass(cls):
+        """Set up class-wide fixtures"""
+        cls.app = create_app(TestingConfig)
+        cls.app.config['WTF_CSRF_ENABLED'] = False
+        cls.app.config['TESTING'] = True
+        
+        with cls.app.app_context():
+            # create_app() has already built the schema. In-memory SQLite lives
+            # on one StaticPool connection, so the schema and this test user
+            # persist for the whole class
+            result = db.session.execute(User.__table__.insert().values(
+                username='testuser',
+                email='test@example.com',
+                password_hash=TEST_PASSWORD_HASH
+            ))
+            db.session.commit()
+            cls.test_user_id = result.inserted_primary_key[0]
+            db.session.remove()
+            
+            # pysqlite defers BEGIN and mishandles SAVEPOINT; let SQLAlchemy
+            # emit BEGIN itself so the per-test rollback undoes everything
+            raw_connection = db.engine.raw_connection()
+            raw_connection.driver_connection.isolation_level = None
+            raw_connection.close()
+            event.listen(db.engine, 'begin', lambda conn: conn.exec_driver_sql('BEGIN'))
+        
+        cls.app_session = db.session
+    
+    @classmethod
+    def tearDownClass(cls):
+        """Clean up class-wide fixtures"""
+        with cls.app.app_context():
+            db.drop_all()
+            db.engine.dispose()
     
     def setUp(self):
         """Set up test fixtures"""
-        self.app = create_app(TestingConfig)
         self.app_context = self.app.app_context()
         self.app_context.push()
         
-        # Create test database
-        self.db_fd, self.db_path = tempfile.mkstemp()
-        self.app.config['DATABASE_URL'] = f'sqlite:///{self.db_path}'
-        self.app.config['WTF_CSRF_ENABLED'] = False
-        self.app.config['TESTING'] = True
+        # Route db.session through one outer transaction for this test
+        self.connection = db.engine.connect()
+        self.transaction = self.connection.begin()
+        db.session = scoped_session(sessionmaker(
+            bind=self.connection,
+            join_transaction_mode='create_savepoint'
+        ))
         
-        db.create_all()
+        # A new client has no cookies; the rate limiters are shared by the
+        # class, so start each test with no recorded attempts
         self.client = self.app.test_client()
+        self.app.limiter.reset()
+        rate_limiter.attempts.clear()
         
-        # Create test user
-        self.test_user = User(
-            username='testuser',
-            email='test@example.com',
-            password='Test123!@#'
-        )
-        db.session.add(self.test_user)
-        db.session.commit()
+        self.test_user = db.session.get(User, self.test_user_id)
+    
+    def login_test_user(self):
+        """Log the test user in by writing Flask-Login's session keys directly"""
+        with self.client.session_transaction() as sess:
+            sess['_user_id'] = str(self.test_user_id)
+            sess['_fresh'] = True
     
     def tearDown(self):
         """Clean up test fixtures"""
         db.session.remove()
-        db.drop_all()
-        os.close(self.db_fd)
-        os.unlink(self.db_path)
+        db.session = self.app_session
+        self.transaction.rollback()
+        self.connection.close()
         self.app_context.pop()
 
 class AuthenticationTests(MyDiaryTestCase):
@@ -130,13 +194,6 @@ class AuthenticationTests(MyDiaryTestCase):
 class DashboardTests(MyDiaryTestCase):
     """Test dashboard functionality"""
     
-    def login_test_user(self):
-        """Helper method to login test user"""
-        self.client.post('/auth/login', data={
-            'email': 'test@example.com',
-            'password': 'Test123!@#'
-        })
-    
     def test_dashboard_requires_login(self):
         """Test that dashboard requires authentication"""
         response = self.client.get('/dashboard')
@@ -154,14 +211,13 @@ class DashboardTests(MyDiaryTestCase):
         self.login_test_user()
         
         # Create test entries
-        for i in range(5):
-            entry = Entry(
-                title=f'Test Entry {i}',
-                content=f'This is test entry number {i}',
-                mood='happy',
-                user_id=self.test_user.id
-            )
-            db.session.add(entry)
+        db.session.bulk_insert_mappings(Entry, [{
+            'title': f'Test Entry {i}',
+            'content': f'This is test entry number {i}',
+            'word_count': 5,
+            'mood': 'happy',
+            'user_id': self.test_user.id
+        } for i in range(5)])
         db.session.commit()
         
         response = self.client.get('/dashboard')
@@ -171,13 +227,6 @@ class DashboardTests(MyDiaryTestCase):
 class EntryTests(MyDiaryTestCase):
     """Test diary entry functionality"""
     
-    def login_test_user(self):
-        """Helper method to login test user"""
-        self.client.post('/auth/login', data={
-            'email': 'test@example.com',
-            'password': 'Test123!@#'
-        })
-    
     def test_new_entry_page_loads(self):
         """Test that new entry page loads"""
         self.login_test_user()
@@ -272,13 +321,6 @@ class EntryTests(MyDiaryTestCase):
 class SearchTests(MyDiaryTestCase):
     """Test search functionality"""
     
-    def login_test_user(self):
-        """Helper method to login test user"""
-        self.client.post('/auth/login', data={
-            'email': 'test@example.com',
-            'password': 'Test123!@#'
-        })
-    
     def test_search_page_loads(self):
         """Test that search page loads"""
         self.login_test_user()
@@ -352,6 +394,35 @@ class SecurityTests(MyDiaryTestCase):
         # Should eventually hit rate limit
         self.assertIn(429, responses)  # Too Many Requests
     
+    def test_rate_limit_ignores_forwarded_for(self):
+        """Test that a spoofed X-Forwarded-For header cannot bypass the rate limit"""
+        @rate_limit(limit=2, window=60)
+        def submit():
+            return 'ok'
+        
+        def post_from(address, forwarded_for):
+            with self.app.test_request_context('/submit', method='POST',
+                                               headers={'X-Forwarded-For': forwarded_for},
+                                               environ_base={'REMOTE_ADDR': address}):
+                try:
+                    return submit()
+                except TooManyRequests:
+                    return 429
+        
+        results = [post_from('203.0.113.1', f'198.51.100.{i}') for i in range(3)]
+        self.assertEqual(results, ['ok', 'ok', 429])
+        self.assertEqual(post_from('203.0.113.2', '198.51.100.1'), 'ok')
+    
+    def test_activity_feed_escapes_description(self):
+        """Test that activity descriptions are HTML-escaped"""
+        html = UIHelper.get_activity_feed_html([{
+            'type': 'login',
+            'description': '<script>alert(1)</script>',
+            'timestamp': datetime.utcnow()
+        }])
+        self.assertIn('&lt;script&gt;', html)
+        self.assertNotIn('<script>', html)
+    
     def test_password_strength_validation(self):
         """Test password strength requirements"""
         weak_passwords = ['123', 'password', 'abc', 'test']
@@ -366,32 +437,26 @@ class SecurityTests(MyDiaryTestCase):
             
             # Should reject weak passwords
             self.assertEqual(response.status_code, 200)
-            user = User.query.filter_by(email=f'{password}@example.com').first()
-            self.assertIsNone(user)
+        
+        # None of the weak-password accounts were created (one query for all)
+        emails = [f'{password}@example.com' for password in weak_passwords]
+        self.assertEqual(User.query.filter(User.email.in_(emails)).count(), 0)
 
 class PerformanceTests(MyDiaryTestCase):
     """Test performance aspects"""
     
-    def login_test_user(self):
-        """Helper method to login test user"""
-        self.client.post('/auth/login', data={
-            'email': 'test@example.com',
-            'password': 'Test123!@#'
-        })
-    
     def test_dashboard_load_time(self):
         """Test dashboard load time with many entries"""
         self.login_test_user()
         
-        # Create many entries
-        for i in range(100):
-            entry = Entry(
-                title=f'Entry {i}',
-                content=f'Content for entry {i}',
-                mood='happy',
-                user_id=self.test_user.id
-            )
-            db.session.add(entry)
+        # Create many entries in one batched INSERT
+        db.session.bulk_insert_mappings(Entry, [{
+            'title': f'Entry {i}',
+            'content': f'Content for entry {i}',
+            'word_count': 4,
+            'mood': 'happy',
+            'user_id': self.test_user.id
+        } for i in range(100)])
         db.session.commit()
         
         start_time = datetime.now()
@@ -405,15 +470,14 @@ class PerformanceTests(MyDiaryTestCase):
         """Test search performance with large dataset"""
         self.login_test_user()
         
-        # Create many entries
-        for i in range(200):
-            entry = Entry(
-                title=f'Entry {i}',
-                content=f'Content with keyword test_{i}',
-                mood='happy',
-                user_id=self.test_user.id
-            )
-            db.session.add(entry)
+        # Create many entries in one batched INSERT
+        db.session.bulk_insert_mappings(Entry, [{
+            'title': f'Entry {i}',
+            'content': f'Content with keyword test_{i}',
+            'word_count': 4,
+            'mood': 'happy',
+            'user_id': self.test_user.id
+        } for i in range(200)])
         db.session.commit()
         
         start_time = datetime.now()
@@ -422,6 +486,63 @@ class PerformanceTests(MyDiaryTestCase):
         
         self.assertEqual(response.status_code, 200)
         self.assertLess(search_time, 1.0)  # Should search in under 1 second
+    
+    def test_count_query_limited_and_grouped(self):
+        """Test pagination counts respect LIMIT and GROUP BY"""
+        db.session.bulk_insert_mappings(Entry, [{
+            'title': f'Entry {i}',
+            'content': f'Content for entry {i}',
+            'word_count': 4,
+            'mood': ['happy', 'sad', 'calm'][i % 3],
+            'user_id': self.test_user.id
+        } for i in range(12)])
+        db.session.commit()
+        
+        entries = db.session.query(Entry).filter_by(user_id=self.test_user.id) \
+            .order_by(Entry.created_at.desc())
+        self.assertEqual(PaginationOptimizer.count_query(entries), 12)
+        self.assertEqual(PaginationOptimizer.count_query(entries.limit(5)), 5)
+        
+        moods = db.session.query(Entry.mood, func.count(Entry.id)).group_by(Entry.mood)
+        self.assertEqual(PaginationOptimizer.count_query(moods), 3)
+        
+        page = PaginationOptimizer.get_paginated_query(entries, page=2, per_page=5)
+        self.assertEqual(page['total'], 12)
+        self.assertEqual(page['pages'], 3)
+        self.assertEqual(len(page['items']), 5)
+        self.assertIsInstance(page['items'][0], Entry)
+        
+        page = PaginationOptimizer.get_paginated_query(entries, page=4, per_page=5)
+        self.assertEqual((page['items'], page['total']), ([], 12))
+        
+        distinct_moods = db.session.query(Entry.mood).distinct()
+        page = PaginationOptimizer.get_paginated_query(distinct_moods, page=1, per_page=2, window=False)
+        self.assertEqual(page['total'], 3)
+
+    def test_cached_response_never_sets_cookie(self):
+        """Test that the response cache does not replay one client's cookies"""
+        response_cache = ResponseCache(self.app)
+        visits = []
+        
+        @response_cache.cache_response(timeout=60)
+        def page():
+            visits.append(len(visits) + 1)
+            response = self.app.make_response('page')
+            response.set_cookie('visitor', str(visits[-1]))
+            return response
+        
+        for expected in ('1', '2'):
+            with self.app.test_request_context('/page'):
+                response = page()
+            self.assertIn(f'visitor={expected}', response.headers['Set-Cookie'])
+        
+        @response_cache.cache_response(timeout=60)
+        def plain_page():
+            return 'plain'
+        
+        for _ in range(2):
+            with self.app.test_request_context('/plain'):
+                self.assertNotIn('Set-Cookie', plain_page().headers)
 
 class AccessibilityTests(MyDiaryTestCase):
     """Test accessibility features"""
@@ -500,6 +621,10 @@ def run_all_tests():
     print("My Diary Comprehensive Test Suite")
     print("=" * 50)
     
+    if XDIST_AVAILABLE:
+        # loadscope keeps each class on one worker so its setUpClass runs once
+        return pytest.main(['-n', 'auto', '--dist', 'loadscope', __file__]) == 0
+    
     # Create test suite
     loader = unittest.TestLoader()
     suite = unittest.TestSuite()
@@ -1,6 +1,7 @@
 import os
 from datetime import timedelta
 from dotenv import load_dotenv
+from sqlalchemy.pool import StaticPool
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 INSTANCE_DIR = os.path.join(basedir, 'instance')
@@ -28,6 +29,9 @@ class Config:
     REMEMBER_COOKIE_HTTPONLY = True
     REMEMBER_COOKIE_SAMESITE = 'Lax'
     REMEMBER_COOKIE_DURATION = timedelta(days=30)
+    # Number of reverse proxies whose X-Forwarded-* headers are trusted (ProxyFix);
+    # none unless configured, ProductionConfig assumes one load balancer
+    PROXY_FIX_HOPS = int(os.environ.get('PROXY_FIX_HOPS', 0))
     
     # Additional security headers
     SESSION_COOKIE_NAME = 'my_diary_session'
@@ -44,9 +48,19 @@ class Config:
     REDIS_ENABLED = os.environ.get('REDIS_ENABLED', 'false').lower() in ('1', 'true', 'yes')
     REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
     
+    # PostgreSQL statement timeout for optimized engines; unset means no timeout
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ['DB_STATEMENT_TIMEOUT_MS']) if os.environ.get('DB_STATEMENT_TIMEOUT_MS') else None
+    
+    # Performance monitoring: endpoints excluded from request metrics (static is always skipped)
+    PERF_SKIP_ENDPOINTS = ['i18n.health_check', 'community.health', 'media.health', 'security.health',
+                           'performance.health_check']
+    
     # Application settings
     POSTS_PER_PAGE = 10
 
+    # Markdown rendering: server-side Pygments highlighting is costly, so it is opt-in
+    MARKDOWN_CODEHILITE = os.environ.get('MARKDOWN_CODEHILITE', 'false').lower() in ('1', 'true', 'yes')
+
     # AdSense configuration
     ADSENSE_CLIENT_ID = os.environ.get('ADSENSE_CLIENT_ID', 'ca-pub-2396098605485959')
     ADSENSE_SLOT_ID = os.environ.get('ADSENSE_SLOT_ID')
@@ -75,6 +89,8 @@ class Config:
     PASSWORD_REQUIRE_LOWERCASE = True
     PASSWORD_REQUIRE_NUMBER = True
     PASSWORD_REQUIRE_SPECIAL = True
+    # Werkzeug hash method for new passwords; existing hashes keep their own
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:600000'
 
     # Mail settings
     MAIL_SERVER = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
@@ -98,12 +114,20 @@ class DevelopmentConfig(Config):
 class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    # Every session and test shares one connection, and so one in-memory database
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'poolclass': StaticPool,
+        'connect_args': {'check_same_thread': False}
+    }
     WTF_CSRF_ENABLED = False
+    # Hashing cost is irrelevant in tests; one iteration keeps auth tests fast
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1'
 
 class ProductionConfig(Config):
     # Ensure these are set in production environment variables
     SECRET_KEY = os.environ.get('SECRET_KEY')
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
+    PROXY_FIX_HOPS = int(os.environ.get('PROXY_FIX_HOPS', 1))
 
 # Configuration dictionary
 config = {
@@ -31,6 +31,8 @@ class ProductionConfig:
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = 'Lax'
     PERMANENT_SESSION_LIFETIME = timedelta(hours=24)
+    # Production runs behind one load balancer; trust its X-Forwarded-* headers
+    PROXY_FIX_HOPS = int(os.environ.get('PROXY_FIX_HOPS', 1))
     
     # CSRF protection
     WTF_CSRF_ENABLED = True
@@ -4,23 +4,26 @@ Create admin user in production database
 Run this script on Render to create your user account
 """
 
-import os
 import sys
 from datetime import datetime
 
-# Add the app directory to the path
-sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-
-from app import create_app, db
-from app.models.user import User
+def _bootstrap():
+    """Add the app directory to the path when run as a script."""
+    import os
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 def create_admin_user():
     """Create admin user if it doesn't exist."""
+    from sqlalchemy import select
+    from app import create_app, db
+    from app.models.user import User
+    
+    print("🔧 Creating production user...")
     app = create_app()
     
     with app.app_context():
         # Check if user already exists
-        existing_user = User.query.filter_by(email='kevohmutwiri9@gmail.com').first()
+        existing_user = db.session.scalar(select(User).where(User.email == 'kevohmutwiri9@gmail.com'))
         
         if existing_user:
             print(f"✅ User '{existing_user.username}' already exists in database")
@@ -64,30 +67,48 @@ def create_admin_user():
 
 def list_all_users():
     """List all users in the database."""
+    from sqlalchemy import func, select
+    from app import create_app, db
+    from app.models.user import User
+    
     app = create_app()
     
     with app.app_context():
-        users = User.query.all()
+        total = db.session.scalar(select(func.count(User.id)))
         
-        if not users:
+        if not total:
             print("📭 No users found in database")
             return
         
-        print(f"👥 Found {len(users)} user(s) in database:")
+        print(f"👥 Found {total} user(s) in database:")
         print("-" * 60)
         
-        for user in users:
-            print(f"ID: {user.id}")
-            print(f"Username: {user.username}")
-            print(f"Email: {user.email}")
-            print(f"Active: {user.is_active}")
-            print(f"Verified: {user.is_verified}")
-            print(f"Created: {user.created_at}")
+        # Stream a narrow projection in batches instead of loading every User
+        users = db.session.execute(
+            select(User.id, User.username, User.email, User.created_at)
+            .order_by(User.id)
+            .execution_options(yield_per=500)
+        )
+        
+        for user_id, username, email, created_at in users:
+            print(f"ID: {user_id}")
+            print(f"Username: {username}")
+            print(f"Email: {email}")
+            print(f"Created: {created_at}")
             print("-" * 60)
 
+# Subcommands; running the script without one creates the production user
+COMMANDS = {
+    'create': create_admin_user,
+    'list': list_all_users,
+}
+
 if __name__ == '__main__':
-    if len(sys.argv) > 1 and sys.argv[1] == 'list':
-        list_all_users()
-    else:
-        print("🔧 Creating production user...")
-        create_admin_user()
+    command = COMMANDS.get(sys.argv[1] if len(sys.argv) > 1 else 'create')
+    if command is None:
+        # Unknown subcommand: print usage before anything imports Flask
+        print(f"Usage: python {sys.argv[0]} [{'|'.join(COMMANDS)}]")
+        sys.exit(1)
+    
+    _bootstrap()
+    command()
@@ -81,6 +81,7 @@ echo "📜 Creating startup script..."
 cat > start.sh << 'EOF'
 #!/bin/bash
 export FLASK_ENV=production
+export PROXY_FIX_HOPS=${PROXY_FIX_HOPS:-1}
 export PYTHONPATH=$(pwd)
 source venv/bin/activate
 gunicorn --workers 3 --threads 2 --timeout 120 --bind 0.0.0.0:$PORT wsgi:app
@@ -12,6 +12,7 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from app import create_app, db
 from app.models.user import User
+from sqlalchemy import exists, select
 
 def check_all_users():
     """Check all users in the database."""
@@ -22,7 +23,7 @@ def check_all_users():
         print("=" * 50)
         
         # Get all users
-        users = User.query.all()
+        users = db.session.scalars(select(User)).all()
         
         print(f"Total users in database: {len(users)}")
         print("-" * 50)
@@ -38,7 +39,7 @@ def check_all_users():
         
         # Check specific user
         target_email = "bikoafrikana@gmail.com"
-        target_user = User.query.filter_by(email=target_email).first()
+        target_user = db.session.scalar(select(User).where(User.email == target_email))
         
         print(f"\nChecking specific user: {target_email}")
         if target_user:
@@ -61,11 +62,10 @@ def create_missing_user():
     with app.app_context():
         target_email = "bikoafrikana@gmail.com"
         
-        # Check if user exists
-        existing_user = User.query.filter_by(email=target_email).first()
-        if existing_user:
+        # Check if user exists (EXISTS via the email index, no row is loaded)
+        if db.session.scalar(select(exists().where(User.email == target_email))):
             print(f"User {target_email} already exists")
-            return existing_user
+            return None
         
         # Create user with default password
         try:
@@ -11,12 +11,13 @@ from datetime import datetime
 # Add the app directory to the path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+from sqlalchemy import delete, select
 from app import create_app, db
 from app.models.user import User
 
-def ensure_user_exists():
+def ensure_user_exists(app=None):
     """Ensure user account exists after deployment."""
-    app = create_app()
+    app = app or create_app()
     
     with app.app_context():
         # Your preferred login credentials
@@ -26,8 +27,12 @@ def ensure_user_exists():
         
         print(f"🔧 Ensuring user exists: {email}")
         
+        # Hash up front: PBKDF2 is slow and should not run inside the transaction
+        password_hash = User.hash_password(password)
+        now = datetime.utcnow()
+        
         # Check if user already exists
-        existing_user = User.query.filter_by(email=email).first()
+        existing_user = db.session.scalar(select(User).where(User.email == email))
         
         if existing_user:
             print(f"✅ User '{existing_user.username}' already exists")
@@ -37,10 +42,10 @@ def ensure_user_exists():
             print(f"   Last login: {existing_user.last_login}")
             
             # Update password if needed (in case it was changed)
-            existing_user.set_password(password)
+            existing_user.set_password_hash(password_hash, now)
             existing_user.is_active = True
             existing_user.is_verified = True
-            existing_user.email_verified_at = datetime.utcnow()
+            existing_user.email_verified_at = now
             
             db.session.commit()
             print(f"🔄 Password updated for user: {email}")
@@ -53,11 +58,11 @@ def ensure_user_exists():
                 email=email,
                 is_active=True,
                 is_verified=True,
-                email_verified_at=datetime.utcnow()
+                email_verified_at=now
             )
             
             # Set password
-            user.set_password(password)
+            user.set_password_hash(password_hash, now)
             
             db.session.add(user)
             db.session.commit()
@@ -76,9 +81,9 @@ def ensure_user_exists():
             db.session.rollback()
             return None
 
-def cleanup_test_users():
+def cleanup_test_users(app=None):
     """Remove test/admin users created during deployment."""
-    app = create_app()
+    app = app or create_app()
     
     with app.app_context():
         # Users to clean up (keep only your main account)
@@ -87,31 +92,41 @@ def cleanup_test_users():
             "kevohmutwiri35@gmail.com"
         ]
         
-        for email in cleanup_emails:
-            user = User.query.filter_by(email=email).first()
-            if user:
-                try:
-                    # Delete user's entries first
-                    from app.models.entry import Entry
-                    Entry.query.filter_by(user_id=user.id).delete()
-                    
-                    # Delete the user
-                    db.session.delete(user)
-                    db.session.commit()
-                    print(f"🗑️  Cleaned up test user: {email}")
-                except Exception as e:
-                    print(f"❌ Error cleaning up {email}: {str(e)}")
-                    db.session.rollback()
+        # Load every matching user in one query and remove them in one commit
+        users = db.session.scalars(select(User).where(User.email.in_(cleanup_emails))).all()
+        if not users:
+            return
+        
+        try:
+            # Delete the users' entries first
+            from app.models.entry import Entry
+            db.session.execute(
+                delete(Entry).where(Entry.user_id.in_([user.id for user in users])),
+                execution_options={'synchronize_session': False}
+            )
+            
+            # Delete the users
+            for user in users:
+                db.session.delete(user)
+            db.session.commit()
+            for user in users:
+                print(f"🗑️  Cleaned up test user: {user.email}")
+        except Exception as e:
+            print(f"❌ Error cleaning up test users: {str(e)}")
+            db.session.rollback()
 
 if __name__ == '__main__':
     print("🔧 User Maintenance Script")
     print("=" * 40)
     
+    # One app (and engine/connection pool) shared by both steps
+    app = create_app()
+    
     # Ensure your main user exists
-    ensure_user_exists()
+    ensure_user_exists(app)
     
     # Clean up test users
-    cleanup_test_users()
+    cleanup_test_users(app)
     
     print("\n✅ User maintenance complete!")
     print("You can now login with:")
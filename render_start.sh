@@ -6,6 +6,9 @@ echo "🚀 Starting My Diary application..."
 # Set Flask environment
 export FLASK_ENV=production
 
+# Render terminates requests at one load balancer; ProxyFix trusts that hop
+export PROXY_FIX_HOPS=${PROXY_FIX_HOPS:-1}
+
 # Force SQLite as database for Render (to avoid SQL Server ODBC issues)
 export DATABASE_URL="sqlite:///my_diary.db"
 